@@ -0,0 +1,94 @@
+"""
+On-disk cache for the annotations produced by the CoreNLP and Stanza
+backends, so re-running a script over the same sentences does not parse
+them again.
+
+Every annotation is stored under a hash of (backend, model version,
+annotators, language, sentence), together with the time it was last used.
+When the stored annotations exceed the size limit, the least recently used
+ones are evicted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.annotation_cache.sqlite')
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+class AnnotationCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS annotations ("
+                          "key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS annotations_last_used "
+                          "ON annotations (last_used)")
+
+    @staticmethod
+    def key(backend, version, annotators, lang, text):
+        # text may be a raw sentence or a list of tokens
+        content = json.dumps([backend, version, annotators, lang, text], ensure_ascii=False)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = self.conn.execute("SELECT value FROM annotations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute("UPDATE annotations SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?)",
+                          (key, value, len(value.encode('utf-8')), time.time()))
+
+    def evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM annotations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.conn.execute("SELECT key, size FROM annotations ORDER BY last_used"):
+            evicted.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self.conn.executemany("DELETE FROM annotations WHERE key = ?", evicted)
+
+    def annotate(self, texts, annotate_fn, backend, version, annotators, lang,
+                 serialize=None):
+        """
+        Return the annotation of every element of texts. Only the texts not
+        found in the cache are annotated, calling annotate_fn once with the
+        list of all of them; it must return one annotation per text, in the
+        same order.
+
+        Annotations are stored as strings. If annotate_fn returns any other
+        object, serialize converts it to the stored string, and the object
+        itself is returned for the texts that were not in the cache.
+        """
+        texts = list(texts)
+        keys = [self.key(backend, version, annotators, lang, t) for t in texts]
+        values = [self.get(k) for k in keys]
+        missing = [i for i, v in enumerate(values) if v is None]
+        if missing:
+            for i, value in zip(missing, annotate_fn([texts[i] for i in missing])):
+                values[i] = value
+                self.put(keys[i], serialize(value) if serialize else value)
+            self.evict()
+        self.conn.commit()
+        return values
+
+    def report(self):
+        total = self.hits + self.misses
+        return "Annotation cache: {} hits, {} misses ({:.2f}% hit rate)".format(
+            self.hits, self.misses, 100 * self.hits / total if total else 0.0)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,71 @@
+"""
+Streaming reader of CoNLL-U files shared by the tagging and dependency
+parsing scripts.
+
+The file is read line by line and every sentence is yielded as the list of
+the 10 columns of its lines (comments are dropped), which is both what the
+word lists for the parsers are taken from and what load_conllu_sentences of
+the evaluation script loads, so a treebank is read in a single pass. Files
+ending in .gz or .bz2 are decompressed on the fly.
+"""
+import bz2
+import gzip
+
+
+def open_conllu(path):
+    """
+    Open a CoNLL-U file for reading as text, decompressing it if its name ends
+    in .gz or .bz2.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def read_conllu(file, strict=False):
+    """
+    Generator of the sentences of a CoNLL-U file, given as a path or as a file
+    object open for reading text. Every sentence is the list of the columns of
+    its lines, multiword token ranges and empty nodes included.
+
+    Blank lines outside a sentence are skipped, and a last sentence not
+    followed by a blank line is yielded as well. With strict, both raise
+    ValueError instead, as load_conllu of the evaluation script does.
+    """
+    if isinstance(file, str):
+        with open_conllu(file) as f:
+            yield from read_conllu(f, strict)
+        return
+
+    sentence = []
+    for line in file:
+        line = line.rstrip('\r\n')
+        if not line:
+            if sentence:
+                yield sentence
+                sentence = []
+            elif strict:
+                raise ValueError('There is an empty sentence in the CoNLL-U file')
+        elif not line.startswith('#'):
+            sentence.append(line.split('\t'))
+    if sentence:
+        if strict:
+            raise ValueError('The CoNLL-U file does not end with empty line')
+        yield sentence
+
+
+def sentence_words(sentence):
+    """
+    Words of a sentence yielded by read_conllu, leaving out the multiword
+    token ranges.
+    """
+    return [columns[1] for columns in sentence if '-' not in columns[0]]
+
+
+def conll_text_reader(file):
+    """
+    Words of every sentence of a CoNLL-U file (path or file object).
+    """
+    return [sentence_words(s) for s in read_conllu(file)]
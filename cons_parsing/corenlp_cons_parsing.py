@@ -26,15 +26,20 @@ available in the PYEVALB python package
 
 import nltk
 import stanza
-from stanza.server import CoreNLPClient
 from sacremoses import MosesDetokenizer
 from PYEVALB import scorer, parser
 
 import numpy as np
 import re
+from contextlib import closing
+from utils import annotate_all, corenlp_session
+
+PARSE_ANNOTATORS = ['tokenize', 'ssplit', 'pos', 'parse']
 
 detok = MosesDetokenizer()
 evalb_scorer = scorer.Scorer()
+# The same CoreNLP server is used for both languages
+client = corenlp_session()
 
 recalls_corenlp = []
 precs_corenlp = []
@@ -42,14 +47,10 @@ accs_corenlp = []
 parsed_sents = nltk.corpus.treebank.parsed_sents()
 skipped_sents = 0
 sents_analyzed = 0
-with CoreNLPClient(
-        annotators=['tokenize', 'ssplit', 'pos', 'parse'],
-        output_format="json",
-        timeout=3000001,
-        endpoint='http://localhost:9001') as client:
-    for i, s in enumerate(nltk.corpus.treebank.sents()):
-        sent = detok.detokenize(s)
-        corenlp_model = client.annotate(sent)
+sents = (detok.detokenize(s) for s in nltk.corpus.treebank.sents())
+with closing(annotate_all(client, sents, annotators=PARSE_ANNOTATORS,
+                          output_format="json")) as annotations:
+    for i, corenlp_model in enumerate(annotations):
         gold_sent = parser.create_from_bracket_string(parsed_sents[i].pformat())
         parse_tree = parser.create_from_bracket_string(corenlp_model['sentences'][0]['parse'])
         try:
@@ -76,15 +77,11 @@ accs_corenlp = []
 parsed_sents = nltk.corpus.cess_esp.parsed_sents()
 skipped_sents = 0
 sents_analyzed = 0
-with CoreNLPClient(
-        annotators=['tokenize', 'ssplit', 'pos', 'parse'],
-        output_format="json",
-        timeout=3000001,
-        endpoint='http://localhost:9001',
-        properties='spanish') as client:
-    for i, s in enumerate(nltk.corpus.cess_esp.sents()):
-        sent = detok.detokenize(s)
-        corenlp_model = client.annotate(sent)
+sents = (detok.detokenize(s) for s in nltk.corpus.cess_esp.sents())
+with closing(annotate_all(client, sents, annotators=PARSE_ANNOTATORS,
+                          output_format="json",
+                          properties={'pipelineLanguage': 'es'})) as annotations:
+    for i, corenlp_model in enumerate(annotations):
         # Adequating parsing sent
         parsed_s = re.sub('grup\.nom\.[a-z]*', 'grup.nom', parsed_sents[i].pformat())
         parsed_s = re.sub('s\.a\.[a-z]*', 's.a', parsed_s)
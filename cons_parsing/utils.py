@@ -0,0 +1,8 @@
+import os
+import sys
+# The scripts of this directory import utils first, which puts the root of
+# the repository (with the modules shared by all the directories) on the path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from corenlp_utils import annotate_all, corenlp_session
+
+__all__ = ['annotate_all', 'corenlp_session']
@@ -0,0 +1,160 @@
+"""
+Utilities shared by the scripts that use the CoreNLP Java server through the
+CoreNLPClient wrapper of the Stanza library (tagging, constituency parsing
+and dependency parsing).
+"""
+import atexit
+import glob
+import os
+import threading
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from stanza.server import CoreNLPClient, StartServer
+from stanza.server.client import TimeoutException
+
+CORENLP_ENDPOINT = 'http://localhost:9001'
+CORENLP_TIMEOUT = 3000001
+# Number of annotate requests kept in flight against the CoreNLP server
+CORENLP_WORKERS = 4
+
+_session = None
+
+
+class _ThreadSessions:
+    """
+    Stand-in for the requests module that sends post calls through an HTTP
+    session of the calling thread, since a requests.Session is not meant to
+    be shared between threads. Everything else (exceptions, auth) is taken
+    from requests.
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.sessions = []
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            with self.lock:
+                self.sessions.append(self.local.session)
+        return self.local.session
+
+    def post(self, *args, **kwargs):
+        return self.session().post(*args, **kwargs)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+
+
+class CoreNLPSession(CoreNLPClient):
+    """
+    CoreNLPClient whose annotate requests go through keep-alive HTTP
+    sessions, one per thread, so the connections to the server are reused
+    instead of opening a new one per annotate call.
+
+    CoreNLPClient._request posts with the requests module of
+    stanza.server.client. This client runs that same function with
+    _ThreadSessions in place of requests, so the request building, error
+    handling and server checks are the ones of the installed stanza version,
+    and the stanza module and the other clients are left untouched.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.http = _ThreadSessions()
+        request = CoreNLPClient._request
+        self._post_request = types.FunctionType(
+            request.__code__, dict(request.__globals__, requests=self.http),
+            request.__name__, request.__defaults__, request.__closure__)
+
+    def _request(self, *args, **kwargs):
+        return self._post_request(self, *args, **kwargs)
+
+    def stop(self):
+        self.http.close()
+        super().stop()
+
+
+def corenlp_version():
+    """
+    Version of the local CoreNLP installation, taken from the names of the
+    jars (code and models) in CORENLP_HOME.
+    """
+    home = os.environ.get('CORENLP_HOME', os.path.expanduser('~/stanza_corenlp'))
+    jars = sorted(os.path.basename(j) for j in glob.glob(os.path.join(home, '*.jar')))
+    return ';'.join(jars) or 'unknown'
+
+
+def corenlp_session(**kwargs):
+    """
+    Return the CoreNLP session shared by the whole run. The first call starts
+    the server (or reuses one already listening on the endpoint) and it stays
+    warm until the interpreter exits, so the JVM and the models are loaded
+    only once. The language and the pipeline are chosen per request with the
+    annotators, output_format and properties arguments of annotate, e.g.
+    properties={'pipelineLanguage': 'es'} for spanish.
+
+    Keyword arguments are only used when the server is started.
+    """
+    global _session
+    if _session is None:
+        options = {
+            'annotators': ['tokenize', 'ssplit', 'pos'],
+            'timeout': CORENLP_TIMEOUT,
+            'endpoint': CORENLP_ENDPOINT,
+            'start_server': StartServer.TRY_START,
+            'be_quiet': True,
+        }
+        options.update(kwargs)
+        _session = CoreNLPSession(**options)
+        _session.start()
+        atexit.register(_session.stop)
+    return _session
+
+
+def annotate_all(client, texts, n_workers=None, max_pending=None,
+                 retries=2, **kwargs):
+    """
+    Annotate every text of texts with client, keeping up to n_workers requests
+    in flight at once (CORENLP_WORKERS by default) so the threads of the
+    CoreNLP server are actually used.
+
+    This is a generator yielding the annotations in the same order as texts.
+    At most max_pending texts (2 * n_workers by default) are submitted ahead
+    of the one being yielded, so texts may be a lazy iterable and stopping
+    early only wastes a few requests. A request that times out is retried up
+    to retries times before the TimeoutException is raised. Extra keyword
+    arguments are passed to client.annotate.
+    """
+    n_workers = n_workers or CORENLP_WORKERS
+    max_pending = max_pending or 2 * n_workers
+
+    def annotate(text):
+        for attempt in range(retries + 1):
+            try:
+                return client.annotate(text, **kwargs)
+            except TimeoutException:
+                if attempt == retries:
+                    raise
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        try:
+            for text in texts:
+                pending.append(executor.submit(annotate, text))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Do not wait for requests whose result nobody will read
+            for future in pending:
+                future.cancel()
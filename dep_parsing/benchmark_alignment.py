@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the LCS alignment of multiword spans used by the
+evaluation script conll18_ud_eval.py.
+
+It compares the current align_forms function against the original
+implementation of the CoNLL 2018 evaluation script, which builds the LCS
+table with bounds checks and lowercases the FORMs inside its inner loop,
+on random spans similar to the ones of the Spanish and Finnish treebanks.
+Both must return the same alignments.
+
+Run it with `python benchmark_alignment.py [number_of_spans]`.
+"""
+import random
+import sys
+import timeit
+
+from conll18_ud_eval import align_forms
+
+
+# Original alignment of a multiword span, working on the FORMs of the words
+def original_align_forms(gold_forms, system_forms):
+    gi, si = len(gold_forms), len(system_forms)
+    lcs = [[0] * si for i in range(gi)]
+    for g in reversed(range(gi)):
+        for s in reversed(range(si)):
+            if gold_forms[g].lower() == system_forms[s].lower():
+                lcs[g][s] = 1 + (lcs[g+1][s+1] if g+1 < gi and s+1 < si else 0)
+            lcs[g][s] = max(lcs[g][s], lcs[g+1][s] if g+1 < gi else 0)
+            lcs[g][s] = max(lcs[g][s], lcs[g][s+1] if s+1 < si else 0)
+
+    aligned, s, g = [], 0, 0
+    while g < gi and s < si:
+        if gold_forms[g].lower() == system_forms[s].lower():
+            aligned.append((g, s))
+            g += 1
+            s += 1
+        elif lcs[g][s] == (lcs[g+1][s] if g+1 < gi else 0):
+            g += 1
+        else:
+            s += 1
+    return aligned
+
+
+def random_spans(n, seed=0):
+    r = random.Random(seed)
+    vocabulary = ["de", "el", "a", "los", "se", "lo", "con", "migo", "da", "le", "la", "ssa", "kin"]
+    spans = []
+    for _ in range(n):
+        gold = [r.choice(vocabulary) for _ in range(r.randint(2, 8))]
+        if r.random() < 0.5:
+            # Most system spans are split like the gold ones
+            system = list(gold)
+        else:
+            system = [w if r.random() < 0.7 else r.choice(vocabulary).upper() for w in gold]
+            system = system[:r.randint(1, len(system))] + [r.choice(vocabulary) for _ in range(r.randint(0, 2))]
+        spans.append((gold, system))
+    return spans
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    spans = random_spans(n)
+
+    for gold, system in spans:
+        assert original_align_forms(gold, system) == align_forms([w.lower() for w in gold],
+                                                                 [w.lower() for w in system])
+
+    original = min(timeit.repeat(lambda: [original_align_forms(g, s) for g, s in spans],
+                                 number=1, repeat=3))
+    # The current code lowercases every FORM once, before aligning
+    current = min(timeit.repeat(lambda: [align_forms([w.lower() for w in g], [w.lower() for w in s])
+                                         for g, s in spans], number=1, repeat=3))
+
+    print("Aligned {} multiword spans".format(n))
+    print("Original LCS alignment: {:.3f}s".format(original))
+    print("Current LCS alignment:  {:.3f}s ({:.1f}x faster)".format(current, original / current))
@@ -24,7 +24,8 @@
 
 # Command line usage
 # ------------------
-# conll18_ud_eval.py [-v] gold_conllu_file system_conllu_file
+# conll18_ud_eval.py [-v] [-c] [-s] gold_conllu_file system_conllu_file
+# conll18_ud_eval.py -m manifest_file [-j jobs] [-o output.json|output.csv]
 #
 # - if no -v is given, only the official CoNLL18 UD Shared Task evaluation metrics
 #   are printed
@@ -48,6 +49,12 @@
 #       HEAD+DEPREL(ignoring subtypes)+LEMMAS match
 # - if -c is given, raw counts of correct/gold_total/system_total/aligned words are printed
 #   instead of precision/recall/F1/AlignedAccuracy for all metrics.
+# - if -s is given, the files are read and evaluated sentence by sentence, so
+#   memory does not grow with the size of the files.
+# - if -m is given, every gold_file<TAB>system_file pair listed in the manifest
+#   file is evaluated in a pool of -j processes, loading each gold file only
+#   once, and all the metrics of every pair are written to the -o file as JSON
+#   or CSV (JSON to the standard output by default).
 
 # API usage
 # ---------
@@ -55,11 +62,21 @@
 #   - loads CoNLL-U file from given file object to an internal representation
 #   - the file object should return str in both Python 2 and Python 3
 #   - raises UDError exception if the given file cannot be loaded
+# - load_conllu_sentences(sentences)
+#   - loads sentences given as CoNLL-U text or as lists of the columns of
+#     their lines to the same internal representation, with the same checks
 # - evaluate(gold_ud, system_ud)
 #   - evaluate the given gold and system CoNLL-U files (loaded with load_conllu)
 #   - raises UDError if the concatenated tokens of gold and system file do not match
 #   - returns a dictionary with the metrics described above, each metric having
 #     three fields: precision, recall and f1
+# - evaluate_files(gold_file, system_file)
+#   - same as evaluate(load_conllu(gold_file), load_conllu(system_file)), but
+#     reading both file objects sentence by sentence with bounded memory
+# - evaluate_pairs(pairs, processes=None)
+#   - evaluates a list of (gold_path, system_path) pairs in a pool of processes
+#   - returns an (evaluation, error) tuple per pair, error being the message
+#     of the UDError raised by the pair or None
 
 # Description of token matching
 # -----------------------------
@@ -93,8 +110,16 @@ from __future__ import division
 from __future__ import print_function
 
 import argparse
+import array
+import collections
+import csv
+import gc
 import io
+import json
+import multiprocessing
+import os
 import sys
+import tempfile
 import unicodedata
 import unittest
 import unidecode
@@ -102,6 +127,10 @@ import unidecode
 # CoNLL-U column names
 ID, FORM, LEMMA, UPOS, XPOS, FEATS, HEAD, DEPREL, DEPS, MISC = range(10)
 
+# Metrics returned by evaluate, in the order they are printed
+METRICS = ["Tokens", "Sentences", "Words", "UPOS", "XPOS", "UFeats", "AllTags", "Lemmas",
+           "UAS", "LAS", "CLAS", "MLAS", "BLEX"]
+
 # Content and functional relations
 CONTENT_DEPRELS = {
     "nsubj", "obj", "iobj", "csubj", "ccomp", "xcomp", "obl", "vocative",
@@ -131,87 +160,189 @@ def _decode(text):
 def _encode(text):
     return text if sys.version_info[0] >= 3 or not isinstance(text, unicode) else text.encode("utf-8")
 
+# Internal representation classes. They use __slots__ and share equal column
+# strings, so large treebanks take as little memory as possible. They are
+# defined at module level so loaded treebanks can be pickled.
+class UDRepresentation:
+    __slots__ = ["characters", "tokens", "words", "sentences"]
+    def __init__(self):
+        # Characters of all the tokens in the whole file, as a single string.
+        # Whitespace between tokens is not included.
+        self.characters = ""
+        # List of UDSpan instances with start&end indices into `characters`.
+        self.tokens = []
+        # List of UDWord instances.
+        self.words = []
+        # List of UDSpan instances with start&end indices into `characters`.
+        self.sentences = []
+    # Pickle the representation as flat arrays of integers (columns are indices
+    # into a table of unique strings) instead of an object per span and word,
+    # which is much smaller and faster to load.
+    def __reduce__(self):
+        token_ids = dict((id(token), i) for i, token in enumerate(self.tokens))
+        word_ids = dict((id(word), i) for i, word in enumerate(self.words))
+        string_ids = {}
+        columns = array.array("i", [string_ids.setdefault(column, len(string_ids))
+                                    for word in self.words for column in word.columns])
+        strings = [None] * len(string_ids)
+        for string, i in string_ids.items():
+            strings[i] = string
+        return _unpickle_ud, (
+            self.characters,
+            array.array("i", [i for span in self.tokens for i in (span.start, span.end)]),
+            array.array("i", [i for span in self.sentences for i in (span.start, span.end)]),
+            strings,
+            columns,
+            array.array("i", [token_ids[id(word.span)] for word in self.words]),
+            array.array("b", [word.is_multiword for word in self.words]),
+            array.array("i", [word_ids[id(word.parent)] if word.parent else -1 for word in self.words]))
+
+class UDSpan:
+    __slots__ = ["start", "end"]
+    def __init__(self, start, end):
+        self.start = start
+        # Note that self.end marks the first position **after the end** of span,
+        # so we can use characters[start:end] or range(start, end).
+        self.end = end
+
+class UDWord:
+    __slots__ = ["span", "columns", "is_multiword", "parent", "functional_children",
+                 "is_content_deprel", "is_functional_deprel"]
+    def __init__(self, span, columns, is_multiword, strings):
+        # Span of this word (or MWT, see below) within ud_representation.characters.
+        self.span = span
+        # 10 columns of the CoNLL-U file: ID, FORM, LEMMA,...
+        self.columns = columns
+        # is_multiword==True means that this word is part of a multi-word token.
+        # In that case, self.span marks the span of the whole multi-word token.
+        self.is_multiword = is_multiword
+        # Reference to the UDWord instance representing the HEAD (or None if root).
+        self.parent = None
+        # References to UDWord instances representing functional-deprel children
+        # (an empty tuple until the first one is added, to save memory).
+        self.functional_children = ()
+        # Only consider universal FEATS.
+        self.columns[FEATS] = "|".join(sorted(feat for feat in columns[FEATS].split("|")
+                                              if feat.split("=", 1)[0] in UNIVERSAL_FEATURES))
+        # Let's ignore language-specific deprel subtypes.
+        self.columns[DEPREL] = columns[DEPREL].split(":")[0]
+        # Share the strings equal to the ones of previous words (strings maps
+        # every column string already seen while loading to itself)
+        self.columns = [strings.setdefault(column, column) for column in self.columns]
+        # Precompute which deprels are CONTENT_DEPRELS and which FUNCTIONAL_DEPRELS
+        self.is_content_deprel = self.columns[DEPREL] in CONTENT_DEPRELS
+        self.is_functional_deprel = self.columns[DEPREL] in FUNCTIONAL_DEPRELS
+
+# Rebuild a UDRepresentation pickled by UDRepresentation.__reduce__
+def _unpickle_ud(*state):
+    # The garbage collector would be run many times while creating the words,
+    # without anything to collect
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _rebuild_ud(*state)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def _rebuild_ud(characters, tokens, sentences, strings, columns, word_tokens, multiwords, parents):
+    ud = UDRepresentation()
+    ud.characters = characters
+    ud.tokens = [UDSpan(tokens[i], tokens[i + 1]) for i in range(0, len(tokens), 2)]
+    ud.sentences = [UDSpan(sentences[i], sentences[i + 1]) for i in range(0, len(sentences), 2)]
+    for i, token in enumerate(word_tokens):
+        # The columns were already filtered when the words were first loaded
+        word = UDWord.__new__(UDWord)
+        word.span = ud.tokens[token]
+        word.columns = [strings[column] for column in columns[10 * i:10 * i + 10]]
+        word.is_multiword = bool(multiwords[i])
+        word.parent = None
+        word.functional_children = ()
+        word.is_content_deprel = word.columns[DEPREL] in CONTENT_DEPRELS
+        word.is_functional_deprel = word.columns[DEPREL] in FUNCTIONAL_DEPRELS
+        ud.words.append(word)
+    for word, parent in zip(ud.words, parents):
+        if parent >= 0:
+            word.parent = ud.words[parent]
+    # Same order of functional children as in _load_conllu
+    for word in ud.words:
+        if word.parent and word.is_functional_deprel:
+            if not word.parent.functional_children:
+                word.parent.functional_children = []
+            word.parent.functional_children.append(word)
+    return ud
+
 # Load given CoNLL-U file into internal representation
 def load_conllu(file):
-    # Internal representation classes
-    class UDRepresentation:
-        def __init__(self):
-            # Characters of all the tokens in the whole file.
-            # Whitespace between tokens is not included.
-            self.characters = []
-            # List of UDSpan instances with start&end indices into `characters`.
-            self.tokens = []
-            # List of UDWord instances.
-            self.words = []
-            # List of UDSpan instances with start&end indices into `characters`.
-            self.sentences = []
-    class UDSpan:
-        def __init__(self, start, end):
-            self.start = start
-            # Note that self.end marks the first position **after the end** of span,
-            # so we can use characters[start:end] or range(start, end).
-            self.end = end
-    class UDWord:
-        def __init__(self, span, columns, is_multiword):
-            # Span of this word (or MWT, see below) within ud_representation.characters.
-            self.span = span
-            # 10 columns of the CoNLL-U file: ID, FORM, LEMMA,...
-            self.columns = columns
-            # is_multiword==True means that this word is part of a multi-word token.
-            # In that case, self.span marks the span of the whole multi-word token.
-            self.is_multiword = is_multiword
-            # Reference to the UDWord instance representing the HEAD (or None if root).
-            self.parent = None
-            # List of references to UDWord instances representing functional-deprel children.
-            self.functional_children = []
-            # Only consider universal FEATS.
-            self.columns[FEATS] = "|".join(sorted(feat for feat in columns[FEATS].split("|")
-                                                  if feat.split("=", 1)[0] in UNIVERSAL_FEATURES))
-            # Let's ignore language-specific deprel subtypes.
-            self.columns[DEPREL] = columns[DEPREL].split(":")[0]
-            # Precompute which deprels are CONTENT_DEPRELS and which FUNCTIONAL_DEPRELS
-            self.is_content_deprel = self.columns[DEPREL] in CONTENT_DEPRELS
-            self.is_functional_deprel = self.columns[DEPREL] in FUNCTIONAL_DEPRELS
-
+    return _load_conllu(_decode(line.rstrip("\r\n")) for line in iter(file.readline, ""))
+
+# Load the given sentences into internal representation, without going through
+# the CoNLL-U text. Every sentence is either its CoNLL-U text or a list with the
+# 10 columns of each of its lines (multi-word token ranges included).
+def load_conllu_sentences(sentences):
+    def lines():
+        for sentence in sentences:
+            if isinstance(sentence, list):
+                for columns in sentence:
+                    yield list(columns)
+                yield []
+            else:
+                sentence_lines = sentence.split("\n")
+                if not sentence_lines[-1]:
+                    sentence_lines.pop()
+                for line in sentence_lines:
+                    yield _decode(line.rstrip("\r"))
+    return _load_conllu(lines())
+
+# Load CoNLL-U lines (without end of line) into internal representation. A line
+# may also be given as the list of its columns, the empty list ending a sentence.
+def _load_conllu(lines):
+    # Unique column strings seen while loading
+    strings = {}
+    # FORMs of all the tokens, joined into ud.characters at the end
+    characters = []
     ud = UDRepresentation()
 
     # Load the CoNLL-U file
-    index, sentence_start = 0, None
-    while True:
-        line = file.readline()
-        if not line:
-            break
-        line = _decode(line.rstrip("\r\n"))
-
+    index, sentence_start, lines = 0, None, iter(lines)
+    for line in lines:
         # Handle sentence start boundaries
         if sentence_start is None:
             # Skip comments
-            if line.startswith("#"):
+            if not isinstance(line, list) and line.startswith("#"):
                 continue
             # Start a new sentence
             ud.sentences.append(UDSpan(index, 0))
             sentence_start = len(ud.words)
         if not line:
-            # Add parent and children UDWord links and check there are no cycles
-            def process_word(word):
-                if word.parent == "remapping":
-                    raise UDError("There is a cycle in a sentence")
-                if word.parent is None:
+            # Add parent UDWord links and check there are no cycles. Starting from
+            # every word, follow the HEADs marking the words on the way as
+            # "remapping" until reaching a root or a word already linked (reaching
+            # a "remapping" word means a cycle), then link the words on the way.
+            # Every word is linked once, so the sentence is processed in linear
+            # time and without recursion, however deep the tree is.
+            for word in ud.words[sentence_start:]:
+                chain = []
+                while word.parent is None:
                     head = int(word.columns[HEAD])
                     if head < 0 or head > len(ud.words) - sentence_start:
                         raise UDError("HEAD '{}' points outside of the sentence".format(_encode(word.columns[HEAD])))
-                    if head:
-                        parent = ud.words[sentence_start + head - 1]
-                        word.parent = "remapping"
-                        process_word(parent)
-                        word.parent = parent
-
-            for word in ud.words[sentence_start:]:
-                process_word(word)
-            # func_children cannot be assigned within process_word
-            # because it is called recursively and may result in adding one child twice.
+                    if not head:
+                        break
+                    parent = ud.words[sentence_start + head - 1]
+                    word.parent = "remapping"
+                    chain.append((word, parent))
+                    word = parent
+                if word.parent == "remapping":
+                    raise UDError("There is a cycle in a sentence")
+                for word, parent in chain:
+                    word.parent = parent
+            # func_children are assigned once all the parents are linked, so no
+            # child is added twice.
             for word in ud.words[sentence_start:]:
                 if word.parent and word.is_functional_deprel:
+                    if not word.parent.functional_children:
+                        word.parent.functional_children = []
                     word.parent.functional_children.append(word)
 
             # Check there is a single root node
@@ -224,9 +355,9 @@ def load_conllu(file):
             continue
 
         # Read next token/word
-        columns = line.split("\t")
+        columns = line if isinstance(line, list) else line.split("\t")
         if len(columns) != 10:
-            raise UDError("The CoNLL-U line does not contain 10 tab-separated columns: '{}'".format(_encode(line)))
+            raise UDError("The CoNLL-U line does not contain 10 tab-separated columns: '{}'".format(_encode("\t".join(columns))))
 
         # Skip empty nodes
         if "." in columns[ID]:
@@ -240,7 +371,7 @@ def load_conllu(file):
             raise UDError("There is an empty FORM in the CoNLL-U file")
 
         # Save token
-        ud.characters.extend(columns[FORM])
+        characters.append(columns[FORM])
         ud.tokens.append(UDSpan(index, index + len(columns[FORM])))
         index += len(columns[FORM])
 
@@ -252,11 +383,11 @@ def load_conllu(file):
                 raise UDError("Cannot parse multi-word token ID '{}'".format(_encode(columns[ID])))
 
             for _ in range(start, end + 1):
-                word_line = _decode(file.readline().rstrip("\r\n"))
-                word_columns = word_line.split("\t")
+                word_line = next(lines, "")
+                word_columns = word_line if isinstance(word_line, list) else word_line.split("\t")
                 if len(word_columns) != 10:
-                    raise UDError("The CoNLL-U line does not contain 10 tab-separated columns: '{}'".format(_encode(word_line)))
-                ud.words.append(UDWord(ud.tokens[-1], word_columns, is_multiword=True))
+                    raise UDError("The CoNLL-U line does not contain 10 tab-separated columns: '{}'".format(_encode("\t".join(word_columns))))
+                ud.words.append(UDWord(ud.tokens[-1], word_columns, is_multiword=True, strings=strings))
         # Basic tokens/words
         else:
             try:
@@ -274,25 +405,58 @@ def load_conllu(file):
             if head_id < 0:
                 raise UDError("HEAD cannot be negative")
 
-            ud.words.append(UDWord(ud.tokens[-1], columns, is_multiword=False))
+            ud.words.append(UDWord(ud.tokens[-1], columns, is_multiword=False, strings=strings))
 
     if sentence_start is not None:
         raise UDError("The CoNLL-U file does not end with empty line")
 
+    ud.characters = "".join(characters)
     return ud
 
+# Align the words of a multiword span using LCS on their lowercased FORMs.
+# Returns the (gold, system) pairs of aligned indices within the span.
+def align_forms(gold_forms, system_forms):
+    # Identical spans are aligned word by word, as the LCS would do
+    if gold_forms == system_forms:
+        return [(i, i) for i in range(len(gold_forms))]
+
+    # lcs[g][s] is the length of the LCS of gold_forms[g:] and system_forms[s:].
+    # The table has an extra row and column of zeros, so no bounds checks are needed.
+    lcs = [[0] * (len(system_forms) + 1) for _ in range(len(gold_forms) + 1)]
+    for g in reversed(range(len(gold_forms))):
+        row, next_row, gold_form = lcs[g], lcs[g + 1], gold_forms[g]
+        for s in reversed(range(len(system_forms))):
+            if gold_form == system_forms[s]:
+                row[s] = 1 + next_row[s + 1]
+            else:
+                row[s] = max(next_row[s], row[s + 1])
+
+    aligned, g, s = [], 0, 0
+    while g < len(gold_forms) and s < len(system_forms):
+        if gold_forms[g] == system_forms[s]:
+            aligned.append((g, s))
+            g += 1
+            s += 1
+        elif lcs[g][s] == lcs[g + 1][s]:
+            g += 1
+        else:
+            s += 1
+    return aligned
+
+# Score of a metric, as returned by evaluate
+class Score:
+    def __init__(self, gold_total, system_total, correct, aligned_total=None):
+        self.correct = correct
+        self.gold_total = gold_total
+        self.system_total = system_total
+        self.aligned_total = aligned_total
+        self.precision = correct / system_total if system_total else 0.0
+        self.recall = correct / gold_total if gold_total else 0.0
+        self.f1 = 2 * correct / (system_total + gold_total) if system_total + gold_total else 0.0
+        self.aligned_accuracy = correct / aligned_total if aligned_total else aligned_total
+
 # Evaluate the gold and system treebanks (loaded using load_conllu).
 def evaluate(gold_ud, system_ud, check_charseq=True, turn_ascii=False):
-    class Score:
-        def __init__(self, gold_total, system_total, correct, aligned_total=None):
-            self.correct = correct
-            self.gold_total = gold_total
-            self.system_total = system_total
-            self.aligned_total = aligned_total
-            self.precision = correct / system_total if system_total else 0.0
-            self.recall = correct / gold_total if gold_total else 0.0
-            self.f1 = 2 * correct / (system_total + gold_total) if system_total + gold_total else 0.0
-            self.aligned_accuracy = correct / aligned_total if aligned_total else aligned_total
     class AlignmentWord:
         def __init__(self, gold_word, system_word):
             self.gold_word = gold_word
@@ -321,31 +485,72 @@ def evaluate(gold_ud, system_ud, check_charseq=True, turn_ascii=False):
 
         return Score(len(gold_spans), len(system_spans), correct)
 
-    def alignment_score(alignment, key_fn=None, filter_fn=None):
-        if filter_fn is not None:
-            gold = sum(1 for gold in alignment.gold_words if filter_fn(gold))
-            system = sum(1 for system in alignment.system_words if filter_fn(system))
-            aligned = sum(1 for word in alignment.matched_words if filter_fn(word.gold_word))
-        else:
-            gold = len(alignment.gold_words)
-            system = len(alignment.system_words)
-            aligned = len(alignment.matched_words)
-
-        if key_fn is None:
-            # Return score for whole aligned words
-            return Score(gold, system, aligned)
-
-        def gold_aligned_gold(word):
-            return word
-        def gold_aligned_system(word):
-            return alignment.matched_words_map.get(word, "NotAligned") if word is not None else None
-        correct = 0
+    # Compute the scores of all the metrics on aligned words in a single pass
+    # over the alignment. A system word matches its aligned gold word in
+    # - UPOS, XPOS, UFeats and AllTags if the corresponding columns are equal,
+    # - Lemmas if LEMMA is equal or the gold LEMMA is "_",
+    # - UAS if its HEAD is aligned to the gold HEAD (or both are roots),
+    # - LAS and CLAS if it matches in UAS and DEPREL,
+    # - MLAS if it matches in LAS, UPOS, UFeats and in the functional children
+    #   (aligned, with the same DEPREL, UPOS and UFeats, in the same order),
+    # - BLEX if it matches in LAS and Lemmas.
+    # CLAS, MLAS and BLEX only consider words with content DEPREL.
+    def alignment_scores(alignment):
+        aligned_map = alignment.matched_words_map
+        upos = xpos = feats = alltags = lemmas = uas = las = 0
+        aligned_content = clas = mlas = blex = 0
         for words in alignment.matched_words:
-            if filter_fn is None or filter_fn(words.gold_word):
-                if key_fn(words.gold_word, gold_aligned_gold) == key_fn(words.system_word, gold_aligned_system):
-                    correct += 1
-
-        return Score(gold, system, correct, aligned)
+            gold_word, system_word = words.gold_word, words.system_word
+            gold_columns, system_columns = gold_word.columns, system_word.columns
+
+            upos_ok = gold_columns[UPOS] == system_columns[UPOS]
+            xpos_ok = gold_columns[XPOS] == system_columns[XPOS]
+            feats_ok = gold_columns[FEATS] == system_columns[FEATS]
+            lemma_ok = gold_columns[LEMMA] == "_" or gold_columns[LEMMA] == system_columns[LEMMA]
+            system_parent = system_word.parent
+            if system_parent is not None:
+                system_parent = aligned_map.get(system_parent, "NotAligned")
+            uas_ok = gold_word.parent is system_parent
+            las_ok = uas_ok and gold_columns[DEPREL] == system_columns[DEPREL]
+
+            upos += upos_ok
+            xpos += xpos_ok
+            feats += feats_ok
+            alltags += upos_ok and xpos_ok and feats_ok
+            lemmas += lemma_ok
+            uas += uas_ok
+            las += las_ok
+
+            if gold_word.is_content_deprel:
+                aligned_content += 1
+                clas += las_ok
+                blex += las_ok and lemma_ok
+                if las_ok and upos_ok and feats_ok:
+                    gold_children, system_children = gold_word.functional_children, system_word.functional_children
+                    if len(gold_children) == len(system_children) and all(
+                            gold_child is aligned_map.get(system_child, "NotAligned") and
+                            gold_child.columns[DEPREL] == system_child.columns[DEPREL] and
+                            gold_child.columns[UPOS] == system_child.columns[UPOS] and
+                            gold_child.columns[FEATS] == system_child.columns[FEATS]
+                            for gold_child, system_child in zip(gold_children, system_children)):
+                        mlas += 1
+
+        gold, system, aligned = len(alignment.gold_words), len(alignment.system_words), len(alignment.matched_words)
+        gold_content = sum(1 for word in alignment.gold_words if word.is_content_deprel)
+        system_content = sum(1 for word in alignment.system_words if word.is_content_deprel)
+        return {
+            "Words": Score(gold, system, aligned),
+            "UPOS": Score(gold, system, upos, aligned),
+            "XPOS": Score(gold, system, xpos, aligned),
+            "UFeats": Score(gold, system, feats, aligned),
+            "AllTags": Score(gold, system, alltags, aligned),
+            "Lemmas": Score(gold, system, lemmas, aligned),
+            "UAS": Score(gold, system, uas, aligned),
+            "LAS": Score(gold, system, las, aligned),
+            "CLAS": Score(gold_content, system_content, clas, aligned_content),
+            "MLAS": Score(gold_content, system_content, mlas, aligned_content),
+            "BLEX": Score(gold_content, system_content, blex, aligned_content),
+        }
 
     def beyond_end(words, i, multiword_span_end):
         if i >= len(words):
@@ -386,16 +591,6 @@ def evaluate(gold_ud, system_ud, check_charseq=True, turn_ascii=False):
                 si += 1
         return gs, ss, gi, si
 
-    def compute_lcs(gold_words, system_words, gi, si, gs, ss):
-        lcs = [[0] * (si - ss) for i in range(gi - gs)]
-        for g in reversed(range(gi - gs)):
-            for s in reversed(range(si - ss)):
-                if gold_words[gs + g].columns[FORM].lower() == system_words[ss + s].columns[FORM].lower():
-                    lcs[g][s] = 1 + (lcs[g+1][s+1] if g+1 < gi-gs and s+1 < si-ss else 0)
-                lcs[g][s] = max(lcs[g][s], lcs[g+1][s] if g+1 < gi-gs else 0)
-                lcs[g][s] = max(lcs[g][s], lcs[g][s+1] if s+1 < si-ss else 0)
-        return lcs
-
     def align_words(gold_words, system_words):
         alignment = Alignment(gold_words, system_words)
 
@@ -406,19 +601,10 @@ def evaluate(gold_ud, system_ud, check_charseq=True, turn_ascii=False):
                 gs, ss, gi, si = find_multiword_span(gold_words, system_words, gi, si)
 
                 if si > ss and gi > gs:
-                    lcs = compute_lcs(gold_words, system_words, gi, si, gs, ss)
-
-                    # Store aligned words
-                    s, g = 0, 0
-                    while g < gi - gs and s < si - ss:
-                        if gold_words[gs + g].columns[FORM].lower() == system_words[ss + s].columns[FORM].lower():
-                            alignment.append_aligned_words(gold_words[gs+g], system_words[ss+s])
-                            g += 1
-                            s += 1
-                        elif lcs[g][s] == (lcs[g+1][s] if g+1 < gi-gs else 0):
-                            g += 1
-                        else:
-                            s += 1
+                    gold_forms = [word.columns[FORM].lower() for word in gold_words[gs:gi]]
+                    system_forms = [word.columns[FORM].lower() for word in system_words[ss:si]]
+                    for g, s in align_forms(gold_forms, system_forms):
+                        alignment.append_aligned_words(gold_words[gs+g], system_words[ss+s])
             else:
                 # B: No multi-word token => align according to spans.
                 if (gold_words[gi].span.start, gold_words[gi].span.end) == (system_words[si].span.start, system_words[si].span.end):
@@ -457,52 +643,242 @@ def evaluate(gold_ud, system_ud, check_charseq=True, turn_ascii=False):
     alignment = align_words(gold_ud.words, system_ud.words)
 
     # Compute the F1-scores
-    return {
+    scores = {
         "Tokens": spans_score(gold_ud.tokens, system_ud.tokens),
         "Sentences": spans_score(gold_ud.sentences, system_ud.sentences),
-        "Words": alignment_score(alignment),
-        "UPOS": alignment_score(alignment, lambda w, _: w.columns[UPOS]),
-        "XPOS": alignment_score(alignment, lambda w, _: w.columns[XPOS]),
-        "UFeats": alignment_score(alignment, lambda w, _: w.columns[FEATS]),
-        "AllTags": alignment_score(alignment, lambda w, _: (w.columns[UPOS], w.columns[XPOS], w.columns[FEATS])),
-        "Lemmas": alignment_score(alignment, lambda w, ga: w.columns[LEMMA] if ga(w).columns[LEMMA] != "_" else "_"),
-        "UAS": alignment_score(alignment, lambda w, ga: ga(w.parent)),
-        "LAS": alignment_score(alignment, lambda w, ga: (ga(w.parent), w.columns[DEPREL])),
-        "CLAS": alignment_score(alignment, lambda w, ga: (ga(w.parent), w.columns[DEPREL]),
-                                filter_fn=lambda w: w.is_content_deprel),
-        "MLAS": alignment_score(alignment, lambda w, ga: (ga(w.parent), w.columns[DEPREL], w.columns[UPOS], w.columns[FEATS],
-                                                         [(ga(c), c.columns[DEPREL], c.columns[UPOS], c.columns[FEATS])
-                                                          for c in w.functional_children]),
-                                filter_fn=lambda w: w.is_content_deprel),
-        "BLEX": alignment_score(alignment, lambda w, ga: (ga(w.parent), w.columns[DEPREL],
-                                                          w.columns[LEMMA] if ga(w).columns[LEMMA] != "_" else "_"),
-                                filter_fn=lambda w: w.is_content_deprel),
     }
+    scores.update(alignment_scores(alignment))
+    return scores
 
 
+# Split a CoNLL-U file into the lines (without end of line) of each sentence,
+# including the empty line ending it.
+def _read_sentences(file):
+    sentence = []
+    for line in iter(file.readline, ""):
+        line = _decode(line.rstrip("\r\n"))
+        sentence.append(line)
+        if not line:
+            yield sentence
+            sentence = []
+    if sentence:
+        yield sentence
+
+# Number of characters the tokens of a sentence add to UDRepresentation.characters.
+# Malformed lines are ignored here, they make load_conllu fail later anyway.
+def _sentence_length(lines):
+    length, skip = 0, 0
+    for line in lines:
+        if skip:
+            skip -= 1
+            continue
+        columns = line.split("\t")
+        if len(columns) != 10 or "." in columns[ID]:
+            continue
+        length += sum(1 for c in columns[FORM] if unicodedata.category(c) != "Zs")
+        if "-" in columns[ID]:
+            try:
+                start, end = map(int, columns[ID].split("-"))
+            except ValueError:
+                continue
+            skip = end - start + 1
+    return length
+
+# Evaluate the gold and system CoNLL-U files without loading them completely.
+# Both files are read in lockstep, sentence by sentence, and every time gold and
+# system sentences read so far cover the same number of characters, that chunk
+# is evaluated on its own and its counts added to the totals. No token, word
+# alignment or dependency crosses such a point, so the result is the same as
+# evaluate(load_conllu(gold_file), load_conllu(system_file)), while memory only
+# depends on the size of the chunks.
+# Without check_charseq the two texts may never cover the same number of
+# characters again, so once both chunks hold CHUNK_SENTENCES sentences, the
+# first CHUNK_SENTENCES of each are evaluated together, pairing gold and system
+# sentences by position. The result can then differ from evaluate() when the
+# sentences of the two files do not correspond one to one.
+CHUNK_SENTENCES = 1000
+def evaluate_files(gold_file, system_file, check_charseq=True, turn_ascii=False,
+                   chunk_sentences=CHUNK_SENTENCES):
+    totals = {}
+    def add_chunk(gold_chunk, system_chunk):
+        chunk = evaluate(_load_conllu(line for sentence in gold_chunk for line in sentence),
+                         _load_conllu(line for sentence in system_chunk for line in sentence),
+                         check_charseq=check_charseq, turn_ascii=turn_ascii)
+        for metric, score in chunk.items():
+            counts = totals.setdefault(metric, [0, 0, 0, None])
+            counts[0] += score.gold_total
+            counts[1] += score.system_total
+            counts[2] += score.correct
+            if score.aligned_total is not None:
+                counts[3] = (counts[3] or 0) + score.aligned_total
+
+    gold_sentences, system_sentences = _read_sentences(gold_file), _read_sentences(system_file)
+    gold_chunk, system_chunk, gold_length, system_length = [], [], 0, 0
+    gold_done, system_done = False, False
+    while not gold_done or not system_done:
+        # Read from the side that is behind
+        if not gold_done and (gold_length <= system_length or system_done):
+            sentence = next(gold_sentences, None)
+            if sentence is None:
+                gold_done = True
+                continue
+            gold_chunk.append(sentence)
+            gold_length += _sentence_length(sentence)
+        else:
+            sentence = next(system_sentences, None)
+            if sentence is None:
+                system_done = True
+                continue
+            system_chunk.append(sentence)
+            system_length += _sentence_length(sentence)
+
+        if gold_chunk and system_chunk and gold_length == system_length:
+            add_chunk(gold_chunk, system_chunk)
+            gold_chunk, system_chunk, gold_length, system_length = [], [], 0, 0
+        elif min(len(gold_chunk), len(system_chunk)) >= chunk_sentences:
+            add_chunk(gold_chunk[:chunk_sentences], system_chunk[:chunk_sentences])
+            gold_chunk, system_chunk = gold_chunk[chunk_sentences:], system_chunk[chunk_sentences:]
+            gold_length = sum(_sentence_length(sentence) for sentence in gold_chunk)
+            system_length = sum(_sentence_length(sentence) for sentence in system_chunk)
+    if gold_chunk or system_chunk or not totals:
+        add_chunk(gold_chunk, system_chunk)
+
+    return {metric: Score(*counts) for metric, counts in totals.items()}
+
 def load_conllu_file(path):
     _file = open(path, mode="r", **({"encoding": "utf-8"} if sys.version_info >= (3, 0) else {}))
     return load_conllu(_file)
 
 def evaluate_wrapper(args):
+    if getattr(args, "stream", False):
+        open_args = {"encoding": "utf-8"} if sys.version_info >= (3, 0) else {}
+        with open(args.gold_file, mode="r", **open_args) as gold_file, \
+                open(args.system_file, mode="r", **open_args) as system_file:
+            return evaluate_files(gold_file, system_file)
+
     # Load CoNLL-U files
     gold_ud = load_conllu_file(args.gold_file)
     system_ud = load_conllu_file(args.system_file)
     return evaluate(gold_ud, system_ud)
 
+# Gold files already loaded by this process during the current evaluate_pairs
+# call, shared by all the systems evaluated against them
+_gold_cache = {}
+
+def _evaluate_pair(pair):
+    gold_file, system_file = pair
+    try:
+        if gold_file not in _gold_cache:
+            _gold_cache[gold_file] = load_conllu_file(gold_file)
+        evaluation = evaluate(_gold_cache[gold_file], load_conllu_file(system_file))
+    except (UDError, IOError) as e:
+        return None, str(e)
+    return {metric: (score.gold_total, score.system_total, score.correct, score.aligned_total)
+            for metric, score in evaluation.items()}, None
+
+# Evaluate many (gold_file, system_file) pairs in a pool of processes.
+# Every gold file is loaded once per process and shared by all the systems
+# compared with it: when processes are forked the gold files used by more than
+# one pair are loaded before starting the pool, otherwise each process loads a
+# gold file the first time it needs it. The loaded gold files are dropped when
+# the call returns, so files changed since are read again by the next call.
+# Returns one (evaluation, error) tuple per pair, in the same order; error is
+# the message of the UDError (or IOError) raised by that pair, if any.
+def evaluate_pairs(pairs, processes=None):
+    pairs = list(pairs)
+    try:
+        get_start_method = getattr(multiprocessing, "get_start_method", lambda: "fork")
+        if get_start_method() == "fork":
+            uses = collections.Counter(gold_file for gold_file, _ in pairs)
+            for gold_file in sorted(gold_file for gold_file, count in uses.items() if count > 1):
+                try:
+                    _gold_cache[gold_file] = load_conllu_file(gold_file)
+                except (UDError, IOError):
+                    # Reported by the pairs using it
+                    pass
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_evaluate_pair, pairs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _gold_cache.clear()
+    return [(evaluation and {metric: Score(*counts) for metric, counts in evaluation.items()}, error)
+            for evaluation, error in results]
+
+# Read a manifest with one gold_file<TAB>system_file pair per line. Empty lines
+# and lines starting with # are ignored.
+def read_manifest(path):
+    pairs = []
+    with open(path, mode="r") as manifest:
+        for line in manifest:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            columns = line.split("\t")
+            if len(columns) != 2:
+                raise ValueError("The manifest line does not contain 2 tab-separated columns: '{}'".format(line))
+            pairs.append((columns[0], columns[1]))
+    return pairs
+
+# Write the results of evaluate_pairs as a JSON list or a CSV table (one row per
+# pair), depending on the extension of path ("-" writes JSON to the standard output).
+def write_results(path, pairs, results):
+    rows = []
+    for (gold_file, system_file), (evaluation, error) in zip(pairs, results):
+        row = {"gold_file": gold_file, "system_file": system_file, "error": error}
+        for metric in METRICS:
+            score = evaluation[metric] if evaluation else None
+            for field in ["precision", "recall", "f1", "aligned_accuracy",
+                          "correct", "gold_total", "system_total", "aligned_total"]:
+                row["{}_{}".format(metric, field)] = getattr(score, field) if score else None
+        rows.append(row)
+
+    if path.endswith(".csv"):
+        fields = list(rows[0]) if rows else ["gold_file", "system_file", "error"]
+        with open(path, mode="w") as output:
+            writer = csv.DictWriter(output, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif path == "-":
+        print(json.dumps(rows, indent=2))
+    else:
+        with open(path, mode="w") as output:
+            json.dump(rows, output, indent=2)
+
 def main():
     # Parse arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument("gold_file", type=str,
+    parser.add_argument("gold_file", type=str, nargs="?",
                         help="Name of the CoNLL-U file with the gold data.")
-    parser.add_argument("system_file", type=str,
+    parser.add_argument("system_file", type=str, nargs="?",
                         help="Name of the CoNLL-U file with the predicted data.")
     parser.add_argument("--verbose", "-v", default=False, action="store_true",
                         help="Print all metrics.")
     parser.add_argument("--counts", "-c", default=False, action="store_true",
                         help="Print raw counts of correct/gold/system/aligned words instead of prec/rec/F1 for all metrics.")
+    parser.add_argument("--stream", "-s", default=False, action="store_true",
+                        help="Read the files sentence by sentence instead of loading them completely.")
+    parser.add_argument("--manifest", "-m", type=str,
+                        help="Evaluate all the gold_file<TAB>system_file pairs listed in this file instead.")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Number of processes used with --manifest (all the CPUs by default).")
+    parser.add_argument("--output", "-o", type=str, default="-",
+                        help="JSON or CSV (by extension) file for the results of --manifest (JSON to stdout by default).")
     args = parser.parse_args()
 
+    if args.manifest:
+        try:
+            pairs = read_manifest(args.manifest)
+        except ValueError as e:
+            parser.error(str(e))
+        write_results(args.output, pairs, evaluate_pairs(pairs, args.jobs))
+        return
+    if args.gold_file is None or args.system_file is None:
+        parser.error("gold_file and system_file are required unless --manifest is given")
+
     # Evaluate
     evaluation = evaluate_wrapper(args)
 
@@ -517,7 +893,7 @@ def main():
         else:
             print("Metric     | Precision |    Recall |  F1 Score | AligndAcc")
         print("-----------+-----------+-----------+-----------+-----------")
-        for metric in["Tokens", "Sentences", "Words", "UPOS", "XPOS", "UFeats", "AllTags", "Lemmas", "UAS", "LAS", "CLAS", "MLAS", "BLEX"]:
+        for metric in METRICS:
             if args.counts:
                 print("{:11}|{:10} |{:10} |{:10} |{:10}".format(
                     metric,
@@ -587,3 +963,145 @@ class TestAlignment(unittest.TestCase):
         self._test_ok(["abc a BX c", "def d EX f"], ["ab a b", "cd c d", "ef e f"], 4)
         self._test_ok(["ab a b", "cd bc d"], ["a", "bc", "d"], 2)
         self._test_ok(["a", "bc b c", "d"], ["ab AX BX", "cd CX a"], 1)
+
+class TestLoadSentences(unittest.TestCase):
+    SENTENCE = [
+        ["1-2", "del", "_", "_", "_", "_", "_", "_", "_", "_"],
+        ["1", "de", "de", "ADP", "_", "_", "3", "case", "_", "_"],
+        ["2", "el", "el", "DET", "_", "Gender=Masc|Foo=Bar", "3", "det", "_", "_"],
+        ["3", "mar", "mar", "NOUN", "_", "_", "0", "root", "_", "_"],
+    ]
+
+    @staticmethod
+    def _text(sentence):
+        return "".join("\t".join(columns) + "\r\n" for columns in sentence) + "\r\n"
+
+    @staticmethod
+    def _summary(ud):
+        return (ud.characters,
+                [(s.start, s.end) for s in ud.sentences],
+                [(t.start, t.end) for t in ud.tokens],
+                [(w.columns, w.is_multiword, ud.words.index(w.parent) if w.parent else None,
+                  [ud.words.index(c) for c in w.functional_children]) for w in ud.words])
+
+    def test_same_as_text(self):
+        text = self._text(self.SENTENCE) * 2
+        expected = self._summary(load_conllu(io.StringIO(text)))
+        self.assertEqual(self._summary(load_conllu_sentences([self.SENTENCE, self.SENTENCE])), expected)
+        self.assertEqual(self._summary(load_conllu_sentences([self._text(self.SENTENCE), self.SENTENCE])), expected)
+
+    def test_exception(self):
+        cycle = [columns[:] for columns in self.SENTENCE]
+        cycle[3][HEAD] = "1"
+        self.assertRaisesRegex(UDError, "cycle", load_conllu_sentences, [cycle])
+        self.assertRaisesRegex(UDError, "cycle", load_conllu, io.StringIO(self._text(cycle)))
+        self.assertRaisesRegex(UDError, "10 tab-separated", load_conllu_sentences, [[["1", "a"]]])
+
+class TestEvaluateFiles(unittest.TestCase):
+    GOLD = ("1-2\tdel\t_\t_\t_\t_\t_\t_\t_\t_\n"
+            "1\tde\tde\tADP\t_\t_\t3\tcase\t_\t_\n"
+            "2\tel\tel\tDET\t_\t_\t3\tdet\t_\t_\n"
+            "3\tmar\tmar\tNOUN\t_\t_\t0\troot\t_\t_\n\n"
+            "1\tsal\tsal\tNOUN\t_\t_\t0\troot\t_\t_\n\n"
+            "# comment\n"
+            "1\tola\tola\tNOUN\t_\t_\t0\troot\t_\t_\n\n")
+    SYSTEM = ("1\tdel\tdel\tADP\t_\t_\t2\tcase\t_\t_\n"
+              "2\tmar\tmar\tNOUN\t_\t_\t0\troot\t_\t_\n"
+              "3\tsal\tsal\tVERB\t_\t_\t2\tobj\t_\t_\n\n"
+              "1\tola\tola\tNOUN\t_\t_\t0\troot\t_\t_\n\n")
+
+    @staticmethod
+    def _counts(evaluation):
+        return {metric: (score.correct, score.gold_total, score.system_total, score.aligned_total)
+                for metric, score in evaluation.items()}
+
+    def test_same_as_evaluate(self):
+        for gold, system in [(self.GOLD, self.SYSTEM), (self.SYSTEM, self.GOLD)]:
+            expected = evaluate(load_conllu(io.StringIO(gold)), load_conllu(io.StringIO(system)))
+            self.assertEqual(self._counts(evaluate_files(io.StringIO(gold), io.StringIO(system))),
+                             self._counts(expected))
+
+    def test_exception(self):
+        self.assertRaises(UDError, evaluate_files, io.StringIO(self.GOLD),
+                          io.StringIO(self.SYSTEM.replace("ola", "olb")))
+
+    def test_sentence_limit(self):
+        # The character counts of the two files never match again, so only
+        # the sentence limit cuts the chunks, pairing the sentences by position
+        gold = "1\tab\t_\t_\t_\t_\t0\troot\t_\t_\n2\tc\t_\t_\t_\t_\t1\tdep\t_\t_\n\n" * 3
+        system = gold.replace("\tc\t", "\tcd\t")
+        expected = evaluate(load_conllu(io.StringIO(gold)), load_conllu(io.StringIO(system)),
+                            check_charseq=False)
+        self.assertEqual(self._counts(evaluate_files(io.StringIO(gold), io.StringIO(system),
+                                                     check_charseq=False)),
+                         self._counts(expected))
+        chunked = evaluate_files(io.StringIO(gold), io.StringIO(system),
+                                 check_charseq=False, chunk_sentences=1)
+        self.assertEqual((chunked["Words"].correct, chunked["Words"].gold_total), (3, 6))
+        self.assertLess(expected["Words"].correct, 3)
+
+class TestPickle(unittest.TestCase):
+    def test_same_representation(self):
+        import pickle
+        ud = load_conllu(io.StringIO(TestEvaluateFiles.GOLD))
+        loaded = pickle.loads(pickle.dumps(ud, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(loaded.characters, ud.characters)
+        for spans, loaded_spans in [(ud.tokens, loaded.tokens), (ud.sentences, loaded.sentences)]:
+            self.assertEqual([(span.start, span.end) for span in loaded_spans],
+                             [(span.start, span.end) for span in spans])
+        for word, loaded_word in zip(ud.words, loaded.words):
+            self.assertEqual(loaded_word.columns, word.columns)
+            self.assertEqual(loaded_word.is_multiword, word.is_multiword)
+            self.assertEqual((loaded_word.span.start, loaded_word.span.end), (word.span.start, word.span.end))
+            self.assertEqual(loaded_word.parent and loaded_word.parent.columns, word.parent and word.parent.columns)
+            self.assertEqual([child.columns for child in loaded_word.functional_children],
+                             [child.columns for child in word.functional_children])
+        self.assertEqual(TestEvaluateFiles._counts(evaluate(ud, loaded)),
+                         TestEvaluateFiles._counts(evaluate(ud, ud)))
+
+class TestEvaluatePairs(unittest.TestCase):
+    def test_same_as_evaluate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for name, content in [("gold", TestEvaluateFiles.GOLD), ("system", TestEvaluateFiles.SYSTEM),
+                                  ("bad", TestEvaluateFiles.SYSTEM.replace("ola", "olb"))]:
+                paths[name] = os.path.join(directory, name + ".conllu")
+                with open(paths[name], mode="w") as f:
+                    f.write(content)
+
+            results = evaluate_pairs([(paths["gold"], paths["system"]), (paths["gold"], paths["bad"])], 2)
+        expected = evaluate(load_conllu(io.StringIO(TestEvaluateFiles.GOLD)),
+                            load_conllu(io.StringIO(TestEvaluateFiles.SYSTEM)))
+        self.assertEqual(TestEvaluateFiles._counts(results[0][0]), TestEvaluateFiles._counts(expected))
+        self.assertIsNone(results[0][1])
+        self.assertIsNone(results[1][0])
+        self.assertIsNotNone(results[1][1])
+        self.assertEqual(_gold_cache, {})
+
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "manifest.tsv")
+            with open(path, mode="w") as f:
+                f.write("# gold\tsystem\n\ngold.conllu\tsystem.conllu\n")
+            self.assertEqual(read_manifest(path), [("gold.conllu", "system.conllu")])
+            with open(path, mode="a") as f:
+                f.write("gold.conllu\n")
+            self.assertRaises(ValueError, read_manifest, path)
+
+class TestHeads(unittest.TestCase):
+    @staticmethod
+    def _load_heads(heads):
+        lines = ["{}\tw\t_\t_\t_\t_\t{}\tdep\t_\t_".format(i + 1, head) for i, head in enumerate(heads)]
+        return load_conllu(io.StringIO("\n".join(lines + ["\n"])))
+
+    def test_long_chain(self):
+        # Every word depends on the next one, the last one is the root
+        n = 10 * sys.getrecursionlimit()
+        ud = self._load_heads(list(range(2, n + 1)) + [0])
+        self.assertIs(ud.words[0].parent, ud.words[1])
+        self.assertIsNone(ud.words[-1].parent)
+
+    def test_exception(self):
+        self.assertRaisesRegex(UDError, "There is a cycle in a sentence", self._load_heads, [2, 3, 1, 0])
+        self.assertRaisesRegex(UDError, "HEAD '5' points outside of the sentence", self._load_heads, [2, 5, 0])
+        self.assertRaisesRegex(UDError, "There are multiple roots in a sentence", self._load_heads, [0, 1, 0])
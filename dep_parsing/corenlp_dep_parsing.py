@@ -28,36 +28,42 @@ http://universaldependencies.org/conll18/evaluation.html
 """
 
 import nltk
-from stanza.server import CoreNLPClient
 
 from sacremoses import MosesDetokenizer
 from conll18_ud_eval import evaluate, load_conllu
-from utils import print_results, conll_text_reader
+from utils import print_results, load_gold, write_conll
 
-import io
+from corenlp_utils import annotate_all, corenlp_session, corenlp_version
+from annotation_cache import AnnotationCache
+
+DEPPARSE_ANNOTATORS = ['tokenize', 'ssplit', 'pos', 'parse', 'depparse']
 
 detok = MosesDetokenizer()
 
 # English
-gold_conll_en = ""
-for s in nltk.corpus.dependency_treebank.parsed_sents()[:200]:
-    gold_conll_en += s.to_conll(10) + '\r\n'
-
-corenlp_conll_en = ""
-with CoreNLPClient(
-        annotators=['tokenize', 'ssplit', 'pos', 'parse', 'depparse'],
-        output_format="conllu",
-        timeout=3000001,
-        endpoint='http://localhost:9001') as client:
-    for s in nltk.corpus.dependency_treebank.sents()[:200]:
-        sent = detok.detokenize(s)
-        corenlp_model = client.annotate(sent)
-        corenlp_conll_en += corenlp_model# + '\r\n'
-
-f_corenlp_en = io.StringIO(corenlp_conll_en.replace("Corp.", "Corp").replace("Conn.", "Conn").replace("Â", "").replace("Ltd.", "Ltd"))
+gold_conll_en = [s.to_conll(10) + '\r\n' for s in nltk.corpus.dependency_treebank.parsed_sents()[:200]]
+
+# The same CoreNLP server is used for both languages
+client = corenlp_session()
+# Sentences parsed in previous runs are taken from the cache
+cache = AnnotationCache()
+
+def corenlp_parse(sents, lang):
+    properties = {'pipelineLanguage': lang}
+    return annotate_all(client, sents, annotators=DEPPARSE_ANNOTATORS,
+                        output_format="conllu", properties=properties)
+
+sents = [detok.detokenize(s) for s in nltk.corpus.dependency_treebank.sents()[:200]]
+corenlp_conll_en = cache.annotate(sents, lambda x: corenlp_parse(x, 'en'),
+                                  'corenlp', corenlp_version(),
+                                  DEPPARSE_ANNOTATORS, 'en')
+
+f_corenlp_en = write_conll(s.replace("Corp.", "Corp").replace("Conn.", "Conn").replace("Â", "").replace("Ltd.", "Ltd")
+                           for s in corenlp_conll_en)
 corenlp_en_eval = load_conllu(f_corenlp_en)
 
-f_gold_en = io.StringIO(gold_conll_en.replace("Corp.", "Corp").replace("Conn.", "Conn").replace("Ltd.", "Ltd"))
+f_gold_en = write_conll(s.replace("Corp.", "Corp").replace("Conn.", "Conn").replace("Ltd.", "Ltd")
+                        for s in gold_conll_en)
 gold_en_eval = load_conllu(f_gold_en)
 corenlp_en_evaluation = evaluate(gold_en_eval, corenlp_en_eval)
 
@@ -67,28 +73,19 @@ print_results(corenlp_en_evaluation,
 # Spanish
 spanish_dep_file = '../../dependency/UD_Spanish-AnCora-master/es_ancora-ud-test.conllu'
 
-with open(spanish_dep_file, 'r') as ancora_f:
-    ancora_text = conll_text_reader(ancora_f)
-
-corenlp_conll_es = ""
-with CoreNLPClient(
-        annotators=['tokenize', 'ssplit', 'pos', 'parse', 'depparse'],
-        output_format="conllu",
-        timeout=3000001,
-        endpoint='http://localhost:9001',
-        properties='spanish') as client:
-    for s in ancora_text:
-        sent = detok.detokenize(s)
-        corenlp_model = client.annotate(sent)
-        corenlp_conll_es += corenlp_model# + '\r\n'
-
-with open(spanish_dep_file, 'r') as ancora_f:
-    ancora_eval = load_conllu(ancora_f)
-
-f_corenlp_es = io.StringIO(corenlp_conll_es)
+ancora_text, ancora_eval = load_gold(spanish_dep_file)
+
+sents = [detok.detokenize(s) for s in ancora_text]
+corenlp_conll_es = cache.annotate(sents, lambda x: corenlp_parse(x, 'es'),
+                                  'corenlp', corenlp_version(),
+                                  DEPPARSE_ANNOTATORS, 'es')
+
+f_corenlp_es = write_conll(corenlp_conll_es)
 corenlp_es_eval = load_conllu(f_corenlp_es)
 corenlp_es_evaluation = evaluate(ancora_eval, corenlp_es_eval, check_charseq=False)
 
 print_results(corenlp_es_evaluation,
               "Results for AnCora dataset using CoreNLP Dependency Parser")
 
+print(cache.report())
+cache.close()
@@ -28,40 +28,65 @@ from the NLTK library.
 
 import nltk
 import stanza
-from stanza.utils.conll import CoNLL
 
 from sacremoses import MosesDetokenizer
-from conll18_ud_eval import evaluate, load_conllu
+from conll18_ud_eval import evaluate, load_conllu, load_conllu_sentences
 from sacremoses import MosesDetokenizer
-from utils import print_results, conll_text_reader
+from utils import print_results, load_gold, conll_sentence, write_conll, stanza_rows
 
-import io
+import time
 
+from annotation_cache import AnnotationCache
+from stanza_utils import stanza_pipeline
+
+STANZA_VERSION = '{}/{}'.format(stanza.__version__, stanza.__resources_version__)
+PROCESSORS = 'tokenize,mwt,pos,lemma,depparse'
+# Batch sizes of the POS tagger and the dependency parser in every pipeline
+BATCH_SIZES = {
+    'pos_batch_size': 5000,
+    'depparse_batch_size': 5000,
+}
 
 detok = MosesDetokenizer()
+# Sentences parsed in previous runs are taken from the cache
+cache = AnnotationCache()
+
+
+def stanza_parse(nlp, sents):
+    """
+    Parse all the sentences in a single call to the pipeline, returning the
+    CoNLL-U columns of one sentence per input sentence. Sentences are either
+    pretokenized lists of words or raw strings; the latter are sent as one
+    document separated by blank lines, so the pipeline must be built with
+    tokenize_no_ssplit=True.
+    """
+    start = time.time()
+    doc = nlp(sents if isinstance(sents[0], list) else "\n\n".join(sents))
+    elapsed = time.time() - start
+    print("Stanza parsed {} sentences in {:.2f}s ({:.2f} sentences/sec)".format(
+        len(sents), elapsed, len(sents) / elapsed if elapsed else float('inf')))
+    # Otherwise the parses would be misaligned with the gold sentences
+    if len(doc.sentences) != len(sents):
+        raise ValueError("Stanza returned {} sentences for {} input sentences".format(
+            len(doc.sentences), len(sents)))
+    return list(stanza_rows(doc.sentences))
+
 
 # English
-gold_conll_en = ""
-for s in nltk.corpus.dependency_treebank.parsed_sents()[:200]:
-    gold_conll_en += s.to_conll(10) + '\r\n'
-
-nlp = stanza.Pipeline(processors='tokenize,mwt,pos,lemma,depparse')
-stanza_conll_en = ""
-for s in nltk.corpus.dependency_treebank.sents()[:200]:
-    sent = detok.detokenize(s)
-    doc = nlp(sent)
-    for s in CoNLL.convert_dict(doc.to_dict()):
-        for w in s:
-            for i, content in enumerate(w):
-                stanza_conll_en += content + '\t'
-            stanza_conll_en = stanza_conll_en[:-1] + '\r\n'
-        stanza_conll_en += '\r\n'
-
-f_gold_en = io.StringIO(gold_conll_en)
-f_stanza_en = io.StringIO(stanza_conll_en)
+gold_conll_en = [s.to_conll(10) + '\r\n' for s in nltk.corpus.dependency_treebank.parsed_sents()[:200]]
+
+# Each detokenized sentence is kept as a single sentence by the tokenizer.
+# Pipelines are only loaded if some sentence is not in the cache.
+nlp = stanza_pipeline('en', PROCESSORS, tokenize_no_ssplit=True, **BATCH_SIZES)
+sents = [detok.detokenize(s) for s in nltk.corpus.dependency_treebank.sents()[:200]]
+stanza_conll_en = cache.annotate(sents, lambda x: stanza_parse(nlp, x), 'stanza',
+                                 STANZA_VERSION, PROCESSORS + ';no_ssplit', 'en',
+                                 serialize=conll_sentence)
+
+f_gold_en = write_conll(gold_conll_en)
 
 gold_en_eval = load_conllu(f_gold_en)
-stanza_en_eval = load_conllu(f_stanza_en)
+stanza_en_eval = load_conllu_sentences(stanza_conll_en)
 
 stanza_en_evaluation = evaluate(gold_en_eval, stanza_en_eval)
 
@@ -71,24 +96,14 @@ print_results(stanza_en_evaluation,
 # Spanish
 spanish_dep_file = '../../dependency/UD_Spanish-AnCora-master/es_ancora-ud-test.conllu'
 
-with open(spanish_dep_file, 'r') as ancora_f:
-    ancora_text = conll_text_reader(ancora_f)
+ancora_text, ancora_eval = load_gold(spanish_dep_file)
 
-nlp = stanza.Pipeline(processors='tokenize,mwt,pos,lemma,depparse', tokenize_pretokenized=True, lang='es')
-doc = nlp(ancora_text)
-stanza_conll_es = ""
-for s in CoNLL.convert_dict(doc.to_dict()):
-    for w in s:
-        for i, content in enumerate(w):
-            stanza_conll_es += content + '\t'
-        stanza_conll_es = stanza_conll_es[:-1] + '\r\n'
-    stanza_conll_es += '\r\n'
+nlp = stanza_pipeline('es', PROCESSORS, tokenize_pretokenized=True, **BATCH_SIZES)
+stanza_conll_es = cache.annotate(ancora_text, lambda x: stanza_parse(nlp, x), 'stanza',
+                                 STANZA_VERSION, PROCESSORS, 'es',
+                                 serialize=conll_sentence)
 
-with open(spanish_dep_file, 'r') as ancora_f:
-    ancora_eval = load_conllu(ancora_f)
-
-f_stanza_es = io.StringIO(stanza_conll_es)
-stanza_es_eval = load_conllu(f_stanza_es)
+stanza_es_eval = load_conllu_sentences(stanza_conll_es)
 
 stanza_es_evaluation = evaluate(ancora_eval, stanza_es_eval, turn_ascii=True)
 
@@ -99,24 +114,14 @@ print_results(stanza_es_evaluation,
 # Finnish
 finnish_dep_file = '../../dependency/UD_Finnish-TDT-master/fi_tdt-ud-test.conllu'
 
-with open(finnish_dep_file, 'r') as tdt_f:
-    tdt_text = conll_text_reader(tdt_f)
-
-nlp = stanza.Pipeline(processors='tokenize,mwt,pos,lemma,depparse', tokenize_pretokenized=True, lang='fi')
-doc = nlp(tdt_text)
-stanza_conll_fi = ""
-for s in CoNLL.convert_dict(doc.to_dict()):
-    for w in s:
-        for i, content in enumerate(w):
-            stanza_conll_fi += content + '\t'
-        stanza_conll_fi = stanza_conll_fi[:-1] + '\r\n'
-    stanza_conll_fi += '\r\n'
+tdt_text, tdt_eval = load_gold(finnish_dep_file)
 
-with open(finnish_dep_file, 'r') as tdt_f:
-    tdt_eval = load_conllu(tdt_f)
+nlp = stanza_pipeline('fi', PROCESSORS, tokenize_pretokenized=True, **BATCH_SIZES)
+stanza_conll_fi = cache.annotate(tdt_text, lambda x: stanza_parse(nlp, x), 'stanza',
+                                 STANZA_VERSION, PROCESSORS, 'fi',
+                                 serialize=conll_sentence)
 
-f_stanza_fi = io.StringIO(stanza_conll_fi)
-stanza_fi_eval = load_conllu(f_stanza_fi)
+stanza_fi_eval = load_conllu_sentences(stanza_conll_fi)
 
 stanza_fi_evaluation = evaluate(tdt_eval, stanza_fi_eval, check_charseq=False)
 
@@ -125,28 +130,19 @@ print_results(stanza_fi_evaluation,
 
 # Chinese
 chinese_dep_parse = '../../dependency/UD_Chinese-GSDSimp-master/zh_gsdsimp-ud-test.conllu'
-with open(chinese_dep_parse, 'r') as gsdsimp_f:
-    gsdsimp_text = conll_text_reader(gsdsimp_f)
+gsdsimp_text, gsdsimp_eval = load_gold(chinese_dep_parse)
 
-nlp = stanza.Pipeline(processors='tokenize,pos,lemma,depparse', tokenize_pretokenized=True, lang='zh')
-doc = nlp(gsdsimp_text)
-stanza_conll_zh = ""
-for s in CoNLL.convert_dict(doc.to_dict()):
-    for w in s:
-        for i, content in enumerate(w):
-            stanza_conll_zh += content + '\t'
-        stanza_conll_zh = stanza_conll_zh[:-1] + '\r\n'
-    stanza_conll_zh += '\r\n'
+nlp = stanza_pipeline('zh', 'tokenize,pos,lemma,depparse', tokenize_pretokenized=True, **BATCH_SIZES)
+stanza_conll_zh = cache.annotate(gsdsimp_text, lambda x: stanza_parse(nlp, x), 'stanza',
+                                 STANZA_VERSION, 'tokenize,pos,lemma,depparse', 'zh',
+                                 serialize=conll_sentence)
 
-with open(chinese_dep_parse, 'r') as gsdsimp_f:
-    gsdsimp_eval = load_conllu(gsdsimp_f)
-
-f_stanza_zh = io.StringIO(stanza_conll_zh)
-stanza_zh_eval = load_conllu(f_stanza_zh)
+stanza_zh_eval = load_conllu_sentences(stanza_conll_zh)
 
 stanza_zh_evaluation = evaluate(gsdsimp_eval, stanza_zh_eval)
 
 print_results(stanza_zh_evaluation,
               "Results for GSDSimp dataset using Stanza Dependency Parser")
 
-
+print(cache.report())
+cache.close()
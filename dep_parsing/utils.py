@@ -1,3 +1,20 @@
+import hashlib
+import io
+import os
+import pickle
+import sys
+
+import conll18_ud_eval
+# The scripts of this directory import utils first, which puts the root of
+# the repository (with the modules shared by all the directories) on the path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import conllu_reader
+from conllu_reader import read_conllu, sentence_words
+
+# Gold treebanks loaded in previous runs, one pickle per file
+GOLD_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.gold_cache')
+
+
 def print_results(results, title):
     print(title)
     print("".join(['=']*len(title)))
@@ -14,17 +31,100 @@ def print_results(results, title):
         ))
 
 
-def conll_text_reader(file):
-    result = []
-    sentence = []
-    for line in file.readlines():
-        if line == "\n":
-            result.append(sentence)
-            sentence = []
-            continue
-        if line.startswith('#'):
+def load_gold(path, cache_dir=GOLD_CACHE_DIR):
+    """
+    Load a gold CoNLL-U file, returning the words of every sentence (as
+    conll_text_reader) and its UDRepresentation (as load_conllu).
+
+    Both are pickled in cache_dir, so later runs skip reading and parsing the
+    file. The cached copy is used only while the size and modification time
+    of the file, of conll18_ud_eval.py and of conllu_reader.py are the ones it
+    was saved with.
+
+    Raises conll18_ud_eval.UDError for a file load_conllu does not accept.
+    """
+    stamp = ()
+    for file in [path, conll18_ud_eval.__file__, conllu_reader.__file__]:
+        stat = os.stat(file)
+        stamp += (stat.st_size, stat.st_mtime_ns)
+    cache_file = os.path.join(cache_dir, hashlib.sha256(
+        os.path.abspath(path).encode('utf-8')).hexdigest() + '.pickle')
+
+    try:
+        with open(cache_file, 'rb') as f:
+            if pickle.load(f) == stamp:
+                return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    # Both are taken from a single pass over the file
+    words = []
+    def sentences():
+        try:
+            for s in read_conllu(path, strict=True):
+                words.append(sentence_words(s))
+                yield s
+        except ValueError as e:
+            raise conll18_ud_eval.UDError(str(e))
+    gold = (words, conll18_ud_eval.load_conllu_sentences(sentences()))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(stamp, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(gold, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+    return gold
+
+
+def conll_sentence(sentence):
+    """
+    CoNLL-U text of a sentence, given as the list of word fields returned by
+    stanza's CoNLL.convert_dict.
+    """
+    return "".join("\t".join(w) + "\r\n" for w in sentence) + "\r\n"
+
+
+def write_conll(sentences, file=None):
+    """
+    Write CoNLL-U sentences into file (a new io.StringIO by default) in
+    linear time and rewind it, so it can be passed directly to load_conllu.
+    Each sentence is either its CoNLL-U text or the list of word fields
+    returned by stanza's CoNLL.convert_dict. A file on disk must be opened
+    for both writing and reading (e.g. with mode 'w+').
+    """
+    if file is None:
+        file = io.StringIO()
+    for s in sentences:
+        if isinstance(s, str):
+            file.write(s)
             continue
-        toks = line.split('\t')
-        if '-' not in toks[0]:
-            sentence.append(toks[1])
-    return result
+        for w in s:
+            file.write("\t".join(w))
+            file.write("\r\n")
+        file.write("\r\n")
+    file.seek(0)
+    return file
+
+
+def stanza_rows(sentences):
+    """
+    Columns of the CoNLL-U lines of every stanza Sentence in sentences (e.g.
+    doc.sentences), read directly from its tokens, ready for
+    load_conllu_sentences.
+    """
+    def field(value):
+        return "_" if value is None or value == "" else str(value)
+
+    for sentence in sentences:
+        rows = []
+        for token in sentence.tokens:
+            if len(token.words) > 1:
+                # Older stanza versions use "1-2" strings as token ids
+                token_id = token.id if isinstance(token.id, str) else "{}-{}".format(token.id[0], token.id[-1])
+                rows.append([token_id, token.text] + ["_"] * 8)
+            for w in token.words:
+                rows.append([field(w.id), w.text, field(w.lemma), field(w.upos), field(w.xpos),
+                             field(w.feats), field(w.head), field(w.deprel), field(w.deps),
+                             field(w.misc)])
+        yield rows
@@ -0,0 +1,130 @@
+"""
+Utilities shared by the scripts that use Stanza pipelines (tagging and
+dependency parsing).
+
+Loading the models of a pipeline is the largest fixed cost of those scripts,
+so all the pipelines of a process are kept in a registry keyed by (language,
+processors, options that change the output). A pipeline is only loaded the
+first time it is used and is reused by the later requests for the same
+processors and options, and the least recently used pipelines are evicted
+when the loaded ones exceed a memory budget. The registry lives in a single
+process, so the tagging and dependency parsing scripts do not share it.
+"""
+import gc
+import os
+import time
+
+import stanza
+
+# Approximate memory allowed for the loaded pipelines, in bytes
+STANZA_MEMORY_BUDGET = 4 * 1024 ** 3
+# Options of stanza.Pipeline that do not change its output (nor do the
+# *_batch_size ones), so they are ignored when looking for a loaded pipeline
+RUNTIME_OPTIONS = {'use_gpu', 'device', 'logging_level', 'verbose', 'download_method'}
+
+_registry = None
+
+
+def _model_size(nlp):
+    """
+    Approximate memory used by a pipeline: the size of the model files it
+    was loaded from.
+    """
+    paths = {v for k, v in nlp.config.items() if k.endswith('_path') and isinstance(v, str)}
+    return sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+
+
+class PipelineRegistry:
+    def __init__(self, memory_budget=STANZA_MEMORY_BUDGET, max_idle=None):
+        """
+        Pipelines are evicted, least recently used first, while the loaded
+        ones take more than memory_budget bytes, and also when they have not
+        been used for max_idle seconds (if given).
+        """
+        self.memory_budget = memory_budget
+        self.max_idle = max_idle
+        # key -> [pipeline, size, time of last use]
+        self.pipelines = {}
+        self.loads = 0
+
+    @staticmethod
+    def key(lang, processors, options):
+        return (lang, frozenset(processors.split(',')),
+                tuple(sorted((k, repr(v)) for k, v in options.items()
+                             if k not in RUNTIME_OPTIONS and not k.endswith('_batch_size'))))
+
+    def get(self, lang, processors, **options):
+        """
+        Return a pipeline for lang running processors (a comma separated
+        list, as for stanza.Pipeline) with the given options, loading it only
+        if none with the same processors and options is loaded. A pipeline
+        with more processors is not reused, since it would also run the extra
+        ones. A loaded pipeline keeps the runtime options (e.g. batch sizes)
+        it was loaded with.
+        """
+        key = self.key(lang, processors, options)
+        if key not in self.pipelines:
+            nlp = stanza.Pipeline(lang=lang, processors=processors, **options)
+            self.loads += 1
+            self.pipelines[key] = [nlp, _model_size(nlp), None]
+        self.pipelines[key][2] = time.time()
+        self.evict(keep=key)
+        return self.pipelines[key][0]
+
+    def memory(self):
+        return sum(size for _, size, _ in self.pipelines.values())
+
+    def evict(self, keep=None):
+        """
+        Evict the idle pipelines and, least recently used first, the ones
+        over the memory budget, except keep.
+        """
+        now = time.time()
+        evicted = False
+        for key in sorted(self.pipelines, key=lambda k: self.pipelines[k][2]):
+            if key == keep:
+                continue
+            idle = self.max_idle is not None and now - self.pipelines[key][2] > self.max_idle
+            if idle or self.memory() > self.memory_budget:
+                del self.pipelines[key]
+                evicted = True
+        if evicted:
+            # Free the memory of the models now
+            gc.collect()
+
+    def clear(self):
+        self.pipelines.clear()
+        gc.collect()
+
+
+class LazyPipeline:
+    """
+    Callable standing for a pipeline of the process registry, which is
+    looked up (and loaded if needed) every time it is called, so creating it
+    costs nothing and an evicted pipeline is loaded again transparently.
+    """
+    def __init__(self, lang, processors, **options):
+        self.lang = lang
+        self.processors = processors
+        self.options = options
+
+    def __call__(self, doc):
+        return pipeline_registry().get(self.lang, self.processors, **self.options)(doc)
+
+
+def pipeline_registry():
+    """
+    Return the pipeline registry shared by the whole process.
+    """
+    global _registry
+    if _registry is None:
+        _registry = PipelineRegistry()
+    return _registry
+
+
+def stanza_pipeline(lang, processors, **options):
+    """
+    Pipeline for lang with the given processors and options (as for
+    stanza.Pipeline), loaded from the process registry on its first use.
+    """
+    return LazyPipeline(lang, processors, **options)
@@ -22,8 +22,11 @@ NLTK library.
 """
 import nltk
 import stanza
-from stanza.server import CoreNLPClient
-from utils import tups_to_file
+from utils import tups_to_file, corenlp_tag
+from corenlp_utils import corenlp_session
+
+# The same CoreNLP server is used for both languages
+client = corenlp_session()
 
 # English
 print("Starting tagging in English: Macbeth")
@@ -31,18 +34,9 @@ macbeth_raw = nltk.corpus.gutenberg.raw('shakespeare-macbeth.txt')
 macbeth_words = nltk.word_tokenize(macbeth_raw)
 macbeth_sents = nltk.sent_tokenize(macbeth_raw)
 
-macbeth_corenlp_tags_tup = []
-macbeth_corenlp_tags = []
-with CoreNLPClient(
-        annotators=['tokenize,pos'],
-        timeout=30000,
-        endpoint='http://localhost:9001') as client:
-    # Doing in a loop to keep the same number of tokens
-    for w in macbeth_words:
-        corenlp_model = client.annotate(w)
-        token = corenlp_model.sentence[0].token[0]
-        macbeth_corenlp_tags_tup.append((token.word, token.pos))
-        macbeth_corenlp_tags.append(token.pos)
+# Sentences are sent in batches, keeping the same number of tokens
+macbeth_corenlp_tags_tup = corenlp_tag(client, macbeth_words)
+macbeth_corenlp_tags = [x[1] for x in macbeth_corenlp_tags_tup]
 
 tups_to_file('ingles/OUTPUT_CORENLP.txt', macbeth_corenlp_tags_tup)
 
@@ -57,20 +51,9 @@ with open('español/INPUT.txt', 'r') as f:
     niebla_raw = f.read()
     niebla_tokens = nltk.word_tokenize(niebla_raw)
 
-niebla_corenlp_tags_tup = []
-niebla_corenlp_tags = []
-
-with CoreNLPClient(
-        annotators=['openie'],
-        timeout=30000,
-        endpoint='http://localhost:9001',
-        properties='spanish') as client:
-    for w in niebla_tokens:
-        corenlp_model = client.annotate(w)
-        token = corenlp_model.sentence[0].token[0]
-        niebla_corenlp_tags_tup.append((token.word, token.pos))
-        niebla_corenlp_tags.append(token.pos)
-
+niebla_corenlp_tags_tup = corenlp_tag(client, niebla_tokens,
+                                      properties={'pipelineLanguage': 'es'})
+niebla_corenlp_tags = [x[1] for x in niebla_corenlp_tags_tup]
 
 tups_to_file('español/OUTPUT_CORENLP.txt', niebla_corenlp_tags_tup)
 print("Finished tagging in Spanish: Niebla")
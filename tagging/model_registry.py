@@ -0,0 +1,118 @@
+"""
+Registry of the trained taggers of nltk_tagging.py, so they can be saved
+once and loaded in later runs instead of being trained again.
+
+Every model is a directory holding its artifacts and a metadata.json file
+with the registry version, the creation time, the versions of the libraries
+used and any extra information given when saving it:
+    - tagger.pickle: a pickled tagger (e.g. a CompiledNgramTagger)
+    - vectors.npy: embedding matrix, memory-mapped when loaded
+    - vocabulary.json: words of the rows of the embedding matrix
+    - tags.json: tags of the outputs of the network
+    - network.keras: Keras network
+"""
+import datetime
+import json
+import os
+import pickle
+
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+# Version of the layout of the saved models
+REGISTRY_VERSION = 2
+
+
+class ModelRegistry:
+    def __init__(self, path=MODELS_DIR):
+        self.path = path
+
+    def model_dir(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.model_dir(name), 'metadata.json'))
+
+    def save(self, name, tagger=None, vectors=None, vocabulary=None, tags=None,
+             network=None, **metadata):
+        """
+        Save the given artifacts of a model, replacing any previous version.
+        Extra keyword arguments are stored in its metadata.
+        """
+        model_dir = self.model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        # A model without metadata is not loaded while it is being replaced
+        if self.exists(name):
+            os.remove(os.path.join(model_dir, 'metadata.json'))
+
+        versions = {'numpy': np.__version__}
+        artifacts = []
+        if tagger is not None:
+            import nltk
+            versions['nltk'] = nltk.__version__
+            with open(os.path.join(model_dir, 'tagger.pickle'), 'wb') as f:
+                pickle.dump(tagger, f, protocol=pickle.HIGHEST_PROTOCOL)
+            artifacts.append('tagger')
+        if vectors is not None:
+            np.save(os.path.join(model_dir, 'vectors.npy'), np.asarray(vectors))
+            artifacts.append('vectors')
+        if vocabulary is not None:
+            with open(os.path.join(model_dir, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+                json.dump(list(vocabulary), f, ensure_ascii=False)
+            artifacts.append('vocabulary')
+        if tags is not None:
+            with open(os.path.join(model_dir, 'tags.json'), 'w', encoding='utf-8') as f:
+                json.dump(list(tags), f, ensure_ascii=False)
+            artifacts.append('tags')
+        if network is not None:
+            import keras
+            versions['keras'] = keras.__version__
+            network.save(os.path.join(model_dir, 'network.keras'))
+            artifacts.append('network')
+
+        with open(os.path.join(model_dir, 'metadata.json'), 'w') as f:
+            json.dump({
+                'registry_version': REGISTRY_VERSION,
+                'name': name,
+                'created': datetime.datetime.now().isoformat(),
+                'versions': versions,
+                'artifacts': artifacts,
+                # NumPy numbers are saved as floats
+                'metadata': metadata,
+            }, f, indent=2, default=float)
+
+    def load(self, name):
+        """
+        Load the artifacts of a saved model, returned in a dictionary with the
+        same keys as the arguments of save plus 'metadata'. The embedding
+        matrix is memory-mapped, so it is read from disk only as it is used.
+
+        Raises FileNotFoundError if the model was not saved, and ValueError
+        if it was saved by a different version of the registry.
+        """
+        model_dir = self.model_dir(name)
+        if not self.exists(name):
+            raise FileNotFoundError("Model '{}' not found in {}".format(name, self.path))
+        with open(os.path.join(model_dir, 'metadata.json'), 'r') as f:
+            metadata = json.load(f)
+        if metadata['registry_version'] != REGISTRY_VERSION:
+            raise ValueError("Model '{}' was saved with version {} of the registry, expected {}".format(
+                name, metadata['registry_version'], REGISTRY_VERSION))
+
+        model = {'metadata': metadata}
+        artifacts = metadata['artifacts']
+        if 'tagger' in artifacts:
+            with open(os.path.join(model_dir, 'tagger.pickle'), 'rb') as f:
+                model['tagger'] = pickle.load(f)
+        if 'vectors' in artifacts:
+            model['vectors'] = np.load(os.path.join(model_dir, 'vectors.npy'), mmap_mode='r')
+        if 'vocabulary' in artifacts:
+            with open(os.path.join(model_dir, 'vocabulary.json'), 'r', encoding='utf-8') as f:
+                model['vocabulary'] = json.load(f)
+        if 'tags' in artifacts:
+            with open(os.path.join(model_dir, 'tags.json'), 'r', encoding='utf-8') as f:
+                model['tags'] = json.load(f)
+        if 'network' in artifacts:
+            import keras
+            model['network'] = keras.models.load_model(os.path.join(model_dir, 'network.keras'))
+        return model
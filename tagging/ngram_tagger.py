@@ -0,0 +1,146 @@
+"""
+Compiled version of a trained backoff chain of NLTK n-gram taggers, such as
+the DefaultTagger -> UnigramTagger -> BigramTagger -> TrigramTagger chain of
+nltk_tagging.py, for tagging large amounts of text.
+
+NLTK looks up every token in each tagger of the chain through method calls
+and dictionaries keyed by (tuple of previous tags, word). Here words and tags
+are interned into integer ids once, and the context tables of all the taggers
+are frozen into dictionaries keyed by a single integer, so tagging a token is
+a few integer operations and dictionary lookups. The output is exactly the
+one of the original chain.
+"""
+import unittest
+
+from nltk.tag import AffixTagger, BigramTagger, DefaultTagger, NgramTagger, TrigramTagger, UnigramTagger
+from nltk.tag.api import TaggerI
+
+
+class CompiledNgramTagger(TaggerI):
+    def __init__(self, tagger):
+        """
+        Compile a trained chain of NgramTagger (Unigram, Bigram, Trigram...)
+        ending, optionally, in a DefaultTagger. Any other tagger in the chain
+        raises a ValueError.
+        """
+        chain = []
+        default = None
+        for t in getattr(tagger, '_taggers', [tagger]):
+            if isinstance(t, DefaultTagger):
+                # The taggers after it are never consulted
+                default = t.choose_tag(None, 0, None)
+                break
+            if not isinstance(t, NgramTagger):
+                raise ValueError("Cannot compile the tagger {!r}".format(t))
+            chain.append(t)
+
+        # Interned tags, the default one (None if there is none) being 0
+        tag_ids = {default: 0}
+        # Interned words, 0 being any word not found in the tables
+        word_ids = {}
+        for t in chain:
+            for context, tag in t._context_to_tag.items():
+                tag_ids.setdefault(tag, len(tag_ids))
+                if t._n > 1:
+                    for previous in context[0]:
+                        tag_ids.setdefault(previous, len(tag_ids))
+                    word_ids.setdefault(context[1], len(word_ids) + 1)
+                else:
+                    word_ids.setdefault(context, len(word_ids) + 1)
+
+        self._tags = list(tag_ids)
+        self._words = word_ids
+        self._n_words = len(word_ids) + 1
+        # The previous tags are kept as the digits of an integer in this base,
+        # the least significant being the tag of the previous token. The extra
+        # digit value stands for the missing tags before the start of a sentence.
+        self._base = len(self._tags) + 1
+        start = len(self._tags)
+        max_n = max([t._n for t in chain] + [1])
+        self._start_history = 0
+        for _ in range(max_n - 1):
+            self._start_history = self._start_history * self._base + start
+        self._history_mod = self._base ** (max_n - 1)
+
+        # One table per tagger, keyed by history * self._n_words + word id
+        self._tables = []
+        for t in chain:
+            table = {}
+            for context, tag in t._context_to_tag.items():
+                if t._n > 1:
+                    previous, word = context
+                    history = 0
+                    for p in [start] * (t._n - 1 - len(previous)) + [tag_ids[p] for p in previous]:
+                        history = history * self._base + p
+                else:
+                    word, history = context, 0
+                table[history * self._n_words + word_ids[word]] = tag_ids[tag]
+            self._tables.append((self._base ** (t._n - 1), table))
+
+    def _tag_ids(self, word_ids):
+        tables = self._tables
+        n_words = self._n_words
+        base, history_mod = self._base, self._history_mod
+        history = self._start_history
+        tags = []
+        for w in word_ids:
+            tag = 0
+            # Unknown words are not in any table
+            if w:
+                for mod, table in tables:
+                    t = table.get(history % mod * n_words + w)
+                    if t is not None:
+                        tag = t
+                        break
+            tags.append(tag)
+            history = (history * base + tag) % history_mod
+        return tags
+
+    def tag(self, tokens):
+        get = self._words.get
+        tags = self._tags
+        return [(w, tags[t]) for w, t in zip(tokens, self._tag_ids([get(w, 0) for w in tokens]))]
+
+    def tag_sents(self, sentences):
+        """
+        Tag every sentence separately, as the NLTK taggers do, so the tags of
+        a sentence do not depend on the previous one.
+        """
+        return [self.tag(s) for s in sentences]
+
+
+class TestCompiledNgramTagger(unittest.TestCase):
+    # "can" and "fish" are tagged by their context, which at the start of a
+    # sentence is the missing tags before it
+    TRAIN = [
+        [("I", "PRP"), ("can", "MD"), ("fish", "VB")],
+        [("can", "MD"), ("I", "PRP"), ("fish", "VB")],
+        [("the", "DT"), ("can", "NN"), ("is", "VBZ"), ("big", "JJ")],
+        [("the", "DT"), ("fish", "NN"), ("can", "MD"), ("swim", "VB")],
+        [("fish", "NN"), ("can", "MD"), ("swim", "VB")],
+        [("I", "PRP"), ("fish", "VBP")],
+        [("a", "DT"), ("big", "JJ"), ("fish", "NN")],
+    ]
+    SENTENCES = [
+        ["can", "I", "fish"], ["fish", "can", "fish"], ["the", "can", "can", "swim"],
+        ["I", "fish"], ["a", "big", "can"], ["big", "fish", "is", "big"],
+        ["the", "unknown", "fish"], ["unknown", "can", "swim", "unknown"], ["can"], [],
+    ]
+
+    def _chain(self, default=True):
+        tagger = DefaultTagger("NN") if default else None
+        for cls in [UnigramTagger, BigramTagger, TrigramTagger]:
+            tagger = cls(self.TRAIN, backoff=tagger)
+        return tagger
+
+    def test_same_as_nltk(self):
+        for default in [True, False]:
+            tagger = self._chain(default)
+            compiled = CompiledNgramTagger(tagger)
+            for sentence in self.SENTENCES:
+                self.assertEqual(compiled.tag(sentence), tagger.tag(sentence), sentence)
+            self.assertEqual(compiled.tag_sents(self.SENTENCES), tagger.tag_sents(self.SENTENCES))
+
+    def test_other_tagger(self):
+        self.assertRaises(ValueError, CompiledNgramTagger,
+                          TrigramTagger(self.TRAIN, backoff=AffixTagger(self.TRAIN)))
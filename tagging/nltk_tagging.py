@@ -6,7 +6,7 @@ languages natively supported by the pretrained function pos_tag:
     - Russian
 
 Then I will use train my own TrigramTaggers and a simple NN tagger, using
-Word2Vec representations of the words. To train these taggers, I will
+Word2Vec representations of a window of words. To train these taggers, I will
 use the tagged words from the Penn treebank, available natively in the
 treebank package from NLTK.
 
@@ -19,6 +19,9 @@ available in the Project Gutenberg webpage, at:
 http://gutenberg.org/ebooks/30774
 http://gutenberg.org/files/30774/30774-0.txt
 
+The trained models are saved in the models directory. Running the script
+with --tag-only loads them instead of training them again.
+
 @author: Víctor Manuel Tenorio
 
 Dependency NLTK packages for this script:
@@ -27,27 +30,41 @@ Dependency NLTK packages for this script:
     - averaged_perceptron_tagger_ru
     - treebank
 """
+import argparse
+
 import nltk
-from utils import tups_to_file
+from utils import tups_to_file, tag_sentences
+from ngram_tagger import CompiledNgramTagger
+from model_registry import ModelRegistry
+from tag_agreement import agreement_rate
 
 from gensim.models import Word2Vec
-import numpy as np
-import keras
 from sklearn.model_selection import train_test_split
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--tag-only", action="store_true",
+                    help="Load the models saved by a previous run instead of training them.")
+args = parser.parse_args()
+
+# Trained models are saved here and loaded with --tag-only
+registry = ModelRegistry()
+
 ############################################################
 #################### Pre-Trained Models ####################
 ############################################################
 
 # English tagging Macbeth
 macbeth_raw = nltk.corpus.gutenberg.raw('shakespeare-macbeth.txt')
-macbeth_words = nltk.word_tokenize(macbeth_raw)
 macbeth_sents = nltk.sent_tokenize(macbeth_raw)
+# Same tokens as nltk.word_tokenize(macbeth_raw), kept by sentence
+macbeth_tok_sents = [nltk.word_tokenize(s) for s in macbeth_sents]
+macbeth_words = [w for s in macbeth_tok_sents for w in s]
 
 with open('ingles/INPUT.txt', 'w') as f:
     f.write(macbeth_raw)
 
-macbeth_tags_nltk_tup = nltk.pos_tag(macbeth_words)
+# Every sentence is tagged on its own, in parallel
+macbeth_tags_nltk_tup = [t for s in tag_sentences('eng', macbeth_tok_sents) for t in s]
 macbeth_tags_nltk = [x[1] for x in macbeth_tags_nltk_tup]
 
 tups_to_file('ingles/OUTPUT_NLTK.txt', macbeth_tags_nltk_tup)
@@ -56,9 +73,9 @@ tups_to_file('ingles/OUTPUT_NLTK.txt', macbeth_tags_nltk_tup)
 # File obtained from http://gutenberg.org/ebooks/30774
 # http://gutenberg.org/files/30774/30774-0.txt
 with open('ruso/INPUT.txt', 'r') as f:
-    russian_tokens = nltk.word_tokenize(f.read())
+    russian_sents = [nltk.word_tokenize(s) for s in nltk.sent_tokenize(f.read())]
 
-russian_tags = nltk.pos_tag(russian_tokens, lang='rus')
+russian_tags = [t for s in tag_sentences('rus', russian_sents) for t in s]
 
 tups_to_file('ruso/OUTPUT.txt', russian_tags)
 
@@ -67,88 +84,103 @@ tups_to_file('ruso/OUTPUT.txt', russian_tags)
 ################### Training the Models ####################
 ############################################################
 
-# Gathering the training data from Penn Treebank
-penn_sents = nltk.corpus.treebank.tagged_sents()
-penn_sents_train, penn_sents_test = train_test_split(penn_sents, test_size=0.15)
+if args.tag_only:
+    t3_compiled = registry.load('trigram')['tagger']
+else:
+    # Gathering the training data from Penn Treebank
+    penn_sents = nltk.corpus.treebank.tagged_sents()
+    penn_sents_train, penn_sents_test = train_test_split(penn_sents, test_size=0.15)
 
-# TrigramTagger
-t0 = nltk.DefaultTagger('NN')
-t1 = nltk.UnigramTagger(penn_sents_train, backoff=t0)
-t2 = nltk.BigramTagger(penn_sents_train, backoff=t1)
-t3 = nltk.TrigramTagger(penn_sents_train, backoff=t2)
+    # TrigramTagger
+    t0 = nltk.DefaultTagger('NN')
+    t1 = nltk.UnigramTagger(penn_sents_train, backoff=t0)
+    t2 = nltk.BigramTagger(penn_sents_train, backoff=t1)
+    t3 = nltk.TrigramTagger(penn_sents_train, backoff=t2)
 
-print("Accuracy of the trigramm tagger in a Penn Treebank random test set: ", end="")
-print(t3.evaluate(penn_sents_test))
+    # Same tags as t3, much faster
+    t3_compiled = CompiledNgramTagger(t3)
 
-macbeth_trigram_predictions = t3.tag(macbeth_words)
+    t3_accuracy = t3_compiled.evaluate(penn_sents_test)
+    print("Accuracy of the trigramm tagger in a Penn Treebank random test set: ", end="")
+    print(t3_accuracy)
+
+    registry.save('trigram', tagger=t3_compiled, accuracy=t3_accuracy)
+
+macbeth_trigram_predictions = [t for s in tag_sentences(t3_compiled, macbeth_tok_sents) for t in s]
 macbeth_trigram_tags = [x[1] for x in macbeth_trigram_predictions]
 
 assert len(macbeth_tags_nltk) == len(macbeth_trigram_tags)
-coinc = [macbeth_tags_nltk[i] == macbeth_trigram_tags[i] for i in range(len(macbeth_trigram_tags))]
 print("Percentage of tags that are coincident with NLTK default predictor: ", end="")
-print(100*sum(coinc) / len(macbeth_tags_nltk))
+print(100*agreement_rate(macbeth_tags_nltk, macbeth_trigram_tags))
 
 # Saving to file
 tups_to_file('ingles/OUTPUT_TrigramTagger.txt', macbeth_trigram_predictions)
 
 # Neural network tagger
-penn_sents = nltk.corpus.treebank.sents()
-penn_tagged_words = nltk.corpus.treebank.tagged_words()
-
-penn_tags = list(set([x[1] for x in penn_tagged_words]))
-
-model = Word2Vec(penn_sents, min_count=1, size=100, window=5)
-
-nn_model = keras.Sequential(
-    [
-        keras.layers.Dense(100, activation="relu", name="layer1"),
-        keras.layers.Dense(100, activation="relu", name="layer2"),
-        keras.layers.Dense(len(penn_tags), activation="softmax", name="output"),
-    ]
-)
-
-nn_model.compile(loss='categorical_crossentropy',
-                 optimizer='rmsprop',
-                 metrics=['accuracy'])
-
-x = []
-y = []
-for w in penn_tagged_words:
-    if w[0] in model.wv:
-        x.append(model.wv[w[0]])
-        y.append(penn_tags.index(w[1]))
-x = np.array(x)
-y = np.array(y)
-y = keras.utils.to_categorical(y)
-
-x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.15)
-
-nn_model.fit(x_train, y_train, epochs=50, batch_size=32)
-
-# Evaluating on the Penn treebank random test set
-penn_eval = nn_model.evaluate(x_test, y_test)
-print("Penn Treebank evaluation")
-print("Loss: {} - Accuracy: {}".format(penn_eval[0], 100*penn_eval[1]))
-
-# Predicting for Macbeth
-macbeth_model = Word2Vec(macbeth_sents, min_count=1,
-                         size=100, window=5)
-
-x_macbeth = []
-for w in macbeth_words:
-    if w[0] in macbeth_model.wv:
-        x_macbeth.append(macbeth_model.wv[w[0]])
-x_macbeth = np.array(x_macbeth)
-
-yhat_macbeth = nn_model.predict(x_macbeth)
-
-macbeth_nn_tags_idx = np.argmax(yhat_macbeth, axis=1)
-macbeth_nn_tags = [penn_tags[i] for i in macbeth_nn_tags_idx]
-macbeth_nn_tags_tup = [(macbeth_words[i], penn_tags[j]) for i, j in enumerate(macbeth_nn_tags_idx)]
+# Keras is imported only here, after the last tag_sentences call, since the
+# processes forked by it could hang on the threads TensorFlow starts
+import keras
+from nn_tagger import EmbeddingBatches, embedding_table, predict_tags, to_ids, window_ids, word_index
+
+# Words on each side of the tagged one whose embeddings are given to the network
+NN_WINDOW = 2
+
+if args.tag_only:
+    nn = registry.load('nn')
+    penn_tags, nn_model = nn['tags'], nn['network']
+    nn_vectors = nn['vectors']
+    nn_index = {w: i for i, w in enumerate(nn['vocabulary'])}
+    NN_WINDOW = nn['metadata']['metadata']['window']
+else:
+    penn_sents = nltk.corpus.treebank.sents()
+    penn_tagged_sents = nltk.corpus.treebank.tagged_sents()
+
+    penn_tags = sorted(set([t for s in penn_tagged_sents for _, t in s]))
+
+    model = Word2Vec(penn_sents, min_count=1, size=100, window=5)
+    # Training embeddings, plus the ones for unknown words and padding
+    nn_vectors = embedding_table(model.wv.vectors)
+    nn_index = word_index(model.wv)
+
+    nn_model = keras.Sequential(
+        [
+            keras.layers.Dense(100, activation="relu", name="layer1"),
+            keras.layers.Dense(100, activation="relu", name="layer2"),
+            keras.layers.Dense(len(penn_tags), activation="softmax", name="output"),
+        ]
+    )
+
+    # Labels are tag ids instead of one-hot vectors
+    nn_model.compile(loss='sparse_categorical_crossentropy',
+                     optimizer='rmsprop',
+                     metrics=['accuracy'])
+
+    # Words and tags are turned into ids once, the embeddings of every batch are
+    # taken from nn_vectors when the batch is used
+    x = window_ids(([w for w, _ in s] for s in penn_tagged_sents), nn_index, NN_WINDOW)
+    y = to_ids((t for s in penn_tagged_sents for _, t in s), {t: i for i, t in enumerate(penn_tags)})
+
+    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.15)
+
+    nn_model.fit(EmbeddingBatches(x_train, y_train, nn_vectors, batch_size=32), epochs=50)
+
+    # Evaluating on the Penn treebank random test set
+    penn_eval = nn_model.evaluate(EmbeddingBatches(x_test, y_test, nn_vectors, shuffle=False))
+    print("Penn Treebank evaluation")
+    print("Loss: {} - Accuracy: {}".format(penn_eval[0], 100*penn_eval[1]))
+
+    # Words in the order of the rows of the embedding matrix
+    registry.save('nn', vectors=nn_vectors, tags=penn_tags, network=nn_model,
+                  vocabulary=sorted(nn_index, key=nn_index.get),
+                  window=NN_WINDOW, loss=penn_eval[0], accuracy=penn_eval[1])
+
+# Predicting for Macbeth, with the embeddings of the training vocabulary
+macbeth_nn_tags = predict_tags(nn_model, macbeth_tok_sents, nn_vectors, nn_index,
+                               penn_tags, NN_WINDOW)
+macbeth_nn_tags_tup = list(zip(macbeth_words, macbeth_nn_tags))
 
 assert len(macbeth_tags_nltk) == len(macbeth_nn_tags)
-coinc = [macbeth_tags_nltk[i] == macbeth_nn_tags[i] for i in range(len(macbeth_nn_tags))]
 print("Percentage of tags that are coincident with NLTK default predictor: ", end="")
-print(100*sum(coinc) / len(macbeth_tags_nltk))
+print(100*agreement_rate(macbeth_tags_nltk, macbeth_nn_tags))
 
 tups_to_file('ingles/OUTPUT_NNTagger.txt', macbeth_nn_tags_tup)
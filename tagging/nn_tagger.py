@@ -0,0 +1,109 @@
+"""
+Featurization of the words for the neural network tagger of nltk_tagging.py.
+
+Every word is tagged from the embeddings of a window of words around it.
+Words and tags are mapped to integer ids once, the embeddings of a batch are
+gathered with a single NumPy index into the matrix of Word2Vec vectors, and
+the labels are kept as integer ids (for the sparse_categorical_crossentropy
+loss) instead of one-hot arrays, so the training set is never materialized
+as a dense matrix of vectors.
+
+The words to tag are looked up in the vocabulary of the training embeddings,
+so no embeddings are trained at prediction time. Unknown words fall back to
+their lowercased form and then to the mean of all the embeddings.
+"""
+import math
+
+import keras
+import numpy as np
+
+
+def word_index(wv):
+    """
+    Dictionary from every word of a Word2Vec model to its row in wv.vectors.
+    """
+    if hasattr(wv, 'key_to_index'):
+        return wv.key_to_index
+    # gensim < 4
+    return {w: v.index for w, v in wv.vocab.items()}
+
+
+def to_ids(items, index, missing=-1):
+    """
+    Array with the id of every item in index, missing for the unknown ones.
+    """
+    get = index.get
+    return np.fromiter((get(i, missing) for i in items), dtype=np.int64)
+
+
+def embedding_table(vectors):
+    """
+    Embedding matrix of the tagger: vectors plus a row with their mean, for
+    unknown words, and a row of zeros, padding the windows at the start and
+    end of the sentences.
+    """
+    return np.vstack([vectors, vectors.mean(axis=0), np.zeros(vectors.shape[1], dtype=vectors.dtype)])
+
+
+def window_ids(sentences, index, window=2):
+    """
+    Matrix with one row per word of the sentences (lists of words), holding
+    the rows of the embedding table of the window of 2 * window + 1 words
+    centered on it.
+    """
+    unknown, pad = len(index), len(index) + 1
+    get = index.get
+    ids = [pad] * window
+    for s in sentences:
+        ids.extend(get(w, get(w.lower(), unknown)) for w in s)
+        ids.extend([pad] * window)
+    ids = np.array(ids, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(ids, 2 * window + 1)
+    # Windows centered on the padding between sentences are dropped
+    return windows[ids[window:len(ids) - window] != pad]
+
+
+def predict_tags(network, sentences, vectors, index, tags, window=2, batch_size=1024):
+    """
+    Tag every word of the sentences with the network, returning one tag per
+    word. vectors is the embedding table used to train it and index maps its
+    vocabulary to the rows of vectors.
+    """
+    ids = window_ids(sentences, index, window)
+    if not len(ids):
+        return []
+    probabilities = network.predict(EmbeddingBatches(ids, None, vectors, batch_size, shuffle=False))
+    return [tags[i] for i in np.argmax(probabilities, axis=1)]
+
+
+class EmbeddingBatches(keras.utils.Sequence):
+    """
+    Batches of (embeddings, tag ids) for fit and evaluate, or of embeddings
+    only for predict when labels is None, taking the embeddings of each
+    batch from the rows ids of vectors only when the batch is requested.
+    If ids has one row of several ids per example (e.g. from window_ids),
+    their embeddings are concatenated. The order is shuffled after every
+    epoch.
+    """
+    def __init__(self, ids, labels, vectors, batch_size=32, shuffle=True):
+        super().__init__()
+        self.ids = ids
+        self.labels = labels
+        self.vectors = vectors
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.order = np.arange(len(ids))
+        if shuffle:
+            np.random.shuffle(self.order)
+
+    def __len__(self):
+        return math.ceil(len(self.ids) / self.batch_size)
+
+    def __getitem__(self, i):
+        batch = self.order[i * self.batch_size:(i + 1) * self.batch_size]
+        x = self.vectors[self.ids[batch]].reshape(len(batch), -1)
+        return x if self.labels is None else (x, self.labels[batch])
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
@@ -32,9 +32,11 @@ NLTK library for the macbeth text.
 """
 
 import nltk
-import stanza
+import shutil
 from sacremoses import MosesDetokenizer
-from utils import tups_to_file, conll_text_reader
+from utils import tups_to_file, split_sentences, stanza_tag
+from conllu_reader import conll_text_reader
+from stanza_utils import stanza_pipeline
 
 # English
 print("Starting tagging in English: Macbeth")
@@ -43,23 +45,15 @@ macbeth_words = nltk.word_tokenize(macbeth_raw)
 macbeth_sents = nltk.sent_tokenize(macbeth_raw)
 
 config = {
-    'processors': 'tokenize,pos', # Comma-separated list of processors to use     
-    'lang': 'en', # Language code for the language to build the Pipeline in
     'use_gpu': False, # Configure it to run on GPU
     'tokenize_pretokenized': True # Use pretokenized text as input and disable tokenization
 }
 
-nlp_en = stanza.Pipeline(**config)
-stanza_model = nlp_en([macbeth_words])
-
-macbeth_stanza_tags_tup = []
-macbeth_stanza_tags = []
-for i in stanza_model.sentences:
-    for j in i.words:
-        macbeth_stanza_tags_tup.append((j.text, j.xpos))
-        macbeth_stanza_tags.append(j.xpos)
-
-tups_to_file('ingles/OUTPUT_STANZA.txt', macbeth_stanza_tags_tup)
+# Pipelines are loaded on their first use and shared with any other task of
+# the process needing the same language, processors and options
+nlp_en = stanza_pipeline('en', 'tokenize,pos', **config)
+# The book is tagged by sentences, in batches, and written as it is tagged
+tups_to_file('ingles/OUTPUT_STANZA.txt', stanza_tag(nlp_en, split_sentences(macbeth_words)))
 print("Finished tagging in English: Macbeth")
 
 # Spanish
@@ -71,40 +65,20 @@ with open('español/INPUT.txt', 'r') as f:
     niebla_raw = f.read()
     niebla_tokens = nltk.word_tokenize(niebla_raw)
 
-config['lang'] = 'es'
-nlp_es = stanza.Pipeline(**config)
-stanza_model = nlp_es([niebla_tokens])
-
-niebla_stanza_tags_tup = []
-niebla_stanza_tags = []
-for i in stanza_model.sentences:
-    for j in i.words:
-        niebla_stanza_tags_tup.append((j.text, j.xpos))
-        niebla_stanza_tags.append(j.xpos)
-
-tups_to_file('español/OUTPUT.txt', niebla_stanza_tags_tup)
-tups_to_file('español/OUTPUT_STANZA.txt', niebla_stanza_tags_tup)
+nlp_es = stanza_pipeline('es', 'tokenize,pos', **config)
+tups_to_file('español/OUTPUT_STANZA.txt', stanza_tag(nlp_es, split_sentences(niebla_tokens)))
+shutil.copyfile('español/OUTPUT_STANZA.txt', 'español/OUTPUT.txt')
 
 print("Finished tagging in Spanish: Niebla")
 
 # File obtained from http://gutenberg.org/ebooks/13580
 # http://gutenberg.org/cache/epub/13580/pg13580.txt
 print("Starting tagging in Finnish: Helsinkiin")
+nlp_fi = stanza_pipeline('fi', 'tokenize,pos', **config)
+# Every line is a sentence of whitespace separated tokens, as when the whole
+# text was given to the pretokenized pipeline, read as it is tagged
 with open('finlandes/INPUT.txt', 'r') as f:
-    finnish_raw = f.read()
-
-config['lang'] = 'fi'
-nlp_fi = stanza.Pipeline(**config)
-stanza_model = nlp_fi(finnish_raw)
-
-finnish_stanza_tags_tup = []
-finnish_stanza_tags = []
-for i in stanza_model.sentences:
-    for j in i.words:
-        finnish_stanza_tags_tup.append((j.text, j.xpos))
-        finnish_stanza_tags.append(j.xpos)
-
-tups_to_file('finlandes/OUTPUT.txt', finnish_stanza_tags_tup)
+    tups_to_file('finlandes/OUTPUT.txt', stanza_tag(nlp_fi, (line.split() for line in f)))
 
 print("Finished tagging in Finnish: Helsinkiin")
 
@@ -113,8 +87,7 @@ print("Finished tagging in Finnish: Helsinkiin")
 print("Started tagging in Chinese: GSDSimp")
 chinese_dep_parse = '../../dependency/UD_Chinese-GSDSimp-master/zh_gsdsimp-ud-test.conllu'
 
-with open(chinese_dep_parse, 'r') as gsdsimp_f:
-    gsdsimp_text = conll_text_reader(gsdsimp_f)
+gsdsimp_text = conll_text_reader(chinese_dep_parse)
 
 detok = MosesDetokenizer()
 with open('chino/INPUT.txt', 'w') as f:
@@ -122,16 +95,7 @@ with open('chino/INPUT.txt', 'w') as f:
         sent = detok.detokenize(s)
         f.write(sent + '\n')
 
-nlp_zh = stanza.Pipeline(processors='tokenize,pos,lemma,depparse', tokenize_pretokenized=True, lang='zh')
-stanza_model = nlp_zh(gsdsimp_text)
-
-chinese_stanza_tags_tup = []
-chinese_stanza_tags = []
-for i in stanza_model.sentences:
-    for j in i.words:
-        chinese_stanza_tags_tup.append((j.text, j.xpos))
-        chinese_stanza_tags.append(j.xpos)
-
-tups_to_file('chino/OUTPUT.txt', chinese_stanza_tags_tup)
+nlp_zh = stanza_pipeline('zh', 'tokenize,pos,lemma,depparse', tokenize_pretokenized=True)
+tups_to_file('chino/OUTPUT.txt', stanza_tag(nlp_zh, gsdsimp_text))
 
 print("Finished tagging in Chinese: GSDSimp")
@@ -0,0 +1,154 @@
+"""
+Agreement between the outputs of the taggers of a language, e.g. the
+OUTPUT_NLTK, OUTPUT_TrigramTagger, OUTPUT_NNTagger, OUTPUT_STANZA and
+OUTPUT_CORENLP files of the ingles directory.
+
+All the outputs are loaded into a single matrix of integer tag ids (one row
+per tagger, one column per token) sharing the same vocabulary of tags, so
+the agreement between every pair of taggers, the confusion matrix of a pair
+and the tokens where they disagree are computed with NumPy operations. Penn
+Treebank tags can be mapped to Universal Dependencies tags (PENN_TO_UPOS) to
+compare taggers with different tagsets.
+
+Usage: python tag_agreement.py [--upos] [--confusion TAGGER TAGGER] ingles
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from tag_io import read_columns
+
+# Penn Treebank tags to Universal POS tags
+PENN_TO_UPOS = {
+    'CC': 'CCONJ', 'CD': 'NUM', 'DT': 'DET', 'EX': 'PRON', 'FW': 'X', 'IN': 'ADP',
+    'JJ': 'ADJ', 'JJR': 'ADJ', 'JJS': 'ADJ', 'LS': 'X', 'MD': 'AUX', 'NN': 'NOUN',
+    'NNS': 'NOUN', 'NNP': 'PROPN', 'NNPS': 'PROPN', 'PDT': 'DET', 'POS': 'PART',
+    'PRP': 'PRON', 'PRP$': 'PRON', 'RB': 'ADV', 'RBR': 'ADV', 'RBS': 'ADV',
+    'RP': 'ADP', 'SYM': 'SYM', 'TO': 'PART', 'UH': 'INTJ', 'VB': 'VERB', 'VBD': 'VERB',
+    'VBG': 'VERB', 'VBN': 'VERB', 'VBP': 'VERB', 'VBZ': 'VERB', 'WDT': 'DET',
+    'WP': 'PRON', 'WP$': 'PRON', 'WRB': 'ADV', '.': 'PUNCT', ',': 'PUNCT',
+    ':': 'PUNCT', '``': 'PUNCT', "''": 'PUNCT', '-LRB-': 'PUNCT', '-RRB-': 'PUNCT',
+    '(': 'PUNCT', ')': 'PUNCT', 'HYPH': 'PUNCT', 'NFP': 'PUNCT', '#': 'SYM', '$': 'SYM',
+    'AFX': 'ADJ', 'ADD': 'X', 'GW': 'X', 'XX': 'X', '-NONE-': 'X',
+}
+
+
+def tag_files(directory):
+    """
+    Paths of the OUTPUT_<tagger> files of directory by tagger, taking the
+    .npz version of a file when there is one.
+    """
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'OUTPUT_*'))):
+        name, extension = os.path.splitext(os.path.basename(path)[len('OUTPUT_'):])
+        if extension in ('.txt', '.tsv', '.npz') and (name not in files or extension == '.npz'):
+            files[name] = path
+    return files
+
+
+def load_outputs(paths, mapping=None):
+    """
+    Load the outputs of the taggers, given as {tagger: path}, into a matrix
+    of tag ids with one row per tagger. The tags found in mapping are
+    replaced by their value. Returns (taggers, words, matrix, tags), where
+    words are the tokens of the first output and tags the shared vocabulary.
+    All the outputs must have the same number of tokens.
+    """
+    taggers = list(paths)
+    vocabulary = {}
+    rows = []
+    words = None
+    for tagger in taggers:
+        file_words, tag_ids, file_tags = read_columns(paths[tagger])
+        if words is None:
+            words = file_words
+        elif len(file_words) != len(words):
+            raise ValueError("{} has {} tokens, {} has {}".format(
+                paths[tagger], len(file_words), paths[taggers[0]], len(words)))
+        if mapping:
+            file_tags = [mapping.get(t, t) for t in file_tags]
+        # Ids of the file to ids of the shared vocabulary
+        lookup = np.array([vocabulary.setdefault(t, len(vocabulary)) for t in file_tags], dtype=np.int32)
+        rows.append(lookup[tag_ids] if len(lookup) else np.zeros(len(tag_ids), dtype=np.int32))
+    return taggers, words, np.vstack(rows), list(vocabulary)
+
+
+def pairwise_agreement(matrix):
+    """
+    Matrix with the fraction of tokens with the same tag for every pair of
+    rows of matrix.
+    """
+    n = matrix.shape[1]
+    agreement = np.empty((len(matrix), len(matrix)))
+    for i, row in enumerate(matrix):
+        agreement[i] = np.count_nonzero(matrix == row, axis=1) / n if n else 1.0
+    return agreement
+
+
+def agreement_rate(tags_a, tags_b):
+    """
+    Fraction of positions where two lists of tags of the same length agree.
+    """
+    a, b = np.asarray(tags_a, dtype=object), np.asarray(tags_b, dtype=object)
+    return np.count_nonzero(a == b) / len(a) if len(a) else 1.0
+
+
+def confusion_matrix(ids_a, ids_b, n_tags):
+    """
+    Confusion matrix of two rows of tag ids: element [i, j] is the number of
+    tokens tagged i in ids_a and j in ids_b.
+    """
+    return np.bincount(ids_a.astype(np.int64) * n_tags + ids_b, minlength=n_tags * n_tags).reshape(n_tags, n_tags)
+
+
+def disagreements(matrix):
+    """
+    Indexes of the tokens where not all the rows of matrix have the same tag.
+    """
+    return np.flatnonzero((matrix != matrix[0]).any(axis=0))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", type=str,
+                        help="Directory with the OUTPUT_<tagger> files of a language.")
+    parser.add_argument("--upos", "-u", action="store_true",
+                        help="Map the Penn Treebank tags to Universal POS tags.")
+    parser.add_argument("--confusion", "-c", nargs=2, metavar="TAGGER",
+                        help="Print the most frequent confusions between two taggers.")
+    parser.add_argument("--top", "-t", type=int, default=10,
+                        help="Number of confusions printed.")
+    args = parser.parse_args()
+
+    taggers, words, matrix, tags = load_outputs(tag_files(args.directory),
+                                                PENN_TO_UPOS if args.upos else None)
+
+    print("Agreement (%) over {} tokens".format(len(words)))
+    width = max(len(t) for t in taggers) + 1
+    print(" " * width + "".join("{:>{}}".format(t, width) for t in taggers))
+    for tagger, row in zip(taggers, pairwise_agreement(matrix)):
+        print("{:{}}".format(tagger, width) + "".join("{:>{}.2f}".format(100 * a, width) for a in row))
+    print("Tokens where the taggers do not all agree: {}".format(len(disagreements(matrix))))
+
+    if args.confusion:
+        a, b = (taggers.index(t) for t in args.confusion)
+        confusion = confusion_matrix(matrix[a], matrix[b], len(tags))
+        totals = confusion.sum(axis=1)
+        print("")
+        print("Agreement per {} tag".format(taggers[a]))
+        for i in np.argsort(-totals):
+            if totals[i]:
+                print("{:8} {:7d} {:7.2f}".format(tags[i], totals[i], 100 * confusion[i, i] / totals[i]))
+        print("")
+        print("Most frequent confusions ({} -> {})".format(taggers[a], taggers[b]))
+        np.fill_diagonal(confusion, 0)
+        for index in np.argsort(-confusion, axis=None)[:args.top]:
+            i, j = divmod(int(index), len(tags))
+            if confusion[i, j]:
+                print("{:8} {:8} {:7d}".format(tags[i], tags[j], confusion[i, j]))
+
+
+if __name__ == "__main__":
+    main()
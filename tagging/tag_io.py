@@ -0,0 +1,184 @@
+"""
+Readers and writers of the (word, tag) outputs of the taggers, chosen by the
+extension of the file:
+    - .txt: one str((word, tag)) per line, the format of the OUTPUT*.txt
+      files of this repository
+    - .tsv: one word<TAB>tag per line, written through a large buffer
+    - .npz: columnar NumPy archive with the vocabulary of tags, one integer
+      tag id per token and the words as a single UTF-8 buffer plus the
+      offset of every word in it, using the smallest integer types needed
+
+Words must not contain tabs or newlines to be written as .tsv. A None tag
+(e.g. a missing xpos of Stanza) is written as a line with the word alone
+(no tab) in .tsv and as the vocabulary entry of index none_id in .npz, and
+read back as None in every format, while an empty tag is kept as ''.
+
+The files can also be converted from the command line, e.g.
+`python tag_io.py -f npz ingles/OUTPUT_*.txt` writes ingles/OUTPUT_*.npz.
+"""
+import argparse
+import ast
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def _write_txt(path, tuples):
+    with open(path, 'w', buffering=BUFFER_SIZE) as f:
+        f.writelines(str(t) + '\n' for t in tuples)
+
+
+def _read_txt(path):
+    words, tags = [], []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            # str(t) of two strings without quotes or backslashes inside
+            if (line.startswith("('") and line.endswith("')") and '\\' not in line
+                    and line.count("'") == 4):
+                word, tag = line[2:-2].split("', '")
+            else:
+                word, tag = ast.literal_eval(line)
+            words.append(word)
+            tags.append(tag)
+    return words, tags
+
+
+def _write_tsv(path, tuples):
+    with open(path, 'w', encoding='utf-8', buffering=BUFFER_SIZE) as f:
+        f.writelines('{}\n'.format(w) if t is None else '{}\t{}\n'.format(w, t) for w, t in tuples)
+
+
+def _read_tsv(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        columns = [line.rstrip('\n').split('\t') for line in f]
+    return [c[0] for c in columns], [c[1] if len(c) > 1 else None for c in columns]
+
+
+def _smallest_uint(maximum):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if maximum <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def _write_npz(path, tuples):
+    tuples = list(tuples)
+    words = [w for w, _ in tuples]
+    tags = [t for _, t in tuples]
+    vocabulary = {}
+    tag_ids = np.fromiter((vocabulary.setdefault(t, len(vocabulary)) for t in tags),
+                          dtype=np.int64, count=len(tags))
+    tag_ids = tag_ids.astype(_smallest_uint(len(vocabulary)))
+    encoded = [w.encode('utf-8') for w in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(w) for w in encoded], out=offsets[1:])
+    offsets = offsets.astype(_smallest_uint(offsets[-1]))
+    # Index of the None tag in the vocabulary, -1 if there is none
+    none_id = list(vocabulary).index(None) if None in vocabulary else -1
+    # Written through a file object, so np.savez does not add its extension
+    with open(path, 'wb') as f:
+        np.savez(f, tags=np.array(['' if t is None else t for t in vocabulary], dtype=str),
+                 none_id=none_id, tag_ids=tag_ids,
+                 text=np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets=offsets)
+
+
+def read_columns(path):
+    """
+    Read the output of a tagger as (words, tag_ids, tags): the list of words,
+    a NumPy array with the id of the tag of every word and the list of tags
+    indexed by those ids.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            text = data['text'].tobytes()
+            offsets = data['offsets'].tolist()
+            words = [text[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+            tags = data['tags'].tolist()
+            if data['none_id'] >= 0:
+                tags[data['none_id']] = None
+            return words, data['tag_ids'], tags
+    words, tags = READERS[_extension(path)](path)
+    vocabulary = {}
+    tag_ids = np.fromiter((vocabulary.setdefault(t, len(vocabulary)) for t in tags),
+                          dtype=np.int32, count=len(tags))
+    return words, tag_ids, list(vocabulary)
+
+
+def _read_npz(path):
+    words, tag_ids, tags = read_columns(path)
+    return words, [tags[i] for i in tag_ids.tolist()]
+
+
+WRITERS = {'.txt': _write_txt, '.tsv': _write_tsv, '.npz': _write_npz}
+READERS = {'.txt': _read_txt, '.tsv': _read_tsv, '.npz': _read_npz}
+
+
+def _extension(path):
+    extension = os.path.splitext(path)[1]
+    if extension not in READERS:
+        raise ValueError("Unknown tag file format '{}', expected one of {}".format(
+            extension, ', '.join(sorted(READERS))))
+    return extension
+
+
+def write_tags(path, tuples):
+    """
+    Write (word, tag) tuples in the format given by the extension of path.
+    The .txt and .tsv formats write them as they are produced, so tuples
+    may be a generator of any length.
+    """
+    WRITERS[_extension(path)](path, tuples)
+
+
+def read_tags(path):
+    """
+    Read a list of (word, tag) tuples written in any of the formats.
+    """
+    words, tags = READERS[_extension(path)](path)
+    return list(zip(words, tags))
+
+
+def convert(path, extension):
+    """
+    Convert a file of tags to the format of extension (e.g. '.npz'), saving it
+    next to it with the same name. Returns the path of the new file.
+    """
+    new_path = os.path.splitext(path)[0] + extension
+    words, tags = READERS[_extension(path)](path)
+    WRITERS[_extension(new_path)](new_path, zip(words, tags))
+    return new_path
+
+
+class TestTagIO(unittest.TestCase):
+    TUPLES = [("The", "DT"), ("'quoted'", "''"), ("Año", "NN"), ("a", None), ("b", "NN"), ("c", None),
+              ("d", ""), ("", "NN")]
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for extension in WRITERS:
+                path = os.path.join(directory, "tags" + extension)
+                write_tags(path, self.TUPLES)
+                self.assertEqual(read_tags(path), self.TUPLES, extension)
+
+    def test_columns(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for extension in WRITERS:
+                path = os.path.join(directory, "tags" + extension)
+                write_tags(path, self.TUPLES)
+                words, tag_ids, tags = read_columns(path)
+                self.assertEqual(list(zip(words, [tags[i] for i in tag_ids])), self.TUPLES, extension)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", help="Files of tags to convert.")
+    parser.add_argument("--format", "-f", choices=["txt", "tsv", "npz"], default="npz",
+                        help="Format of the converted files.")
+    args = parser.parse_args()
+    for path in args.files:
+        print("{} -> {}".format(path, convert(path, '.' + args.format)))
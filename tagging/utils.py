@@ -1,21 +1,171 @@
+import multiprocessing
+import os
+import sys
+# The scripts of this directory import utils first, which puts the root of
+# the repository (with the modules shared by all the directories) on the path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tag_io import write_tags
+
+SENTENCE_END = {'.', '!', '?', '...'}
+
+
 def tups_to_file(path, tuples):
-    with open(path, 'w') as f:
-        for t in tuples:
-            f.write(str(t) + '\n')
+    """
+    Write (word, tag) tuples in the format given by the extension of path
+    (.txt, .tsv or .npz, see tag_io).
+    """
+    write_tags(path, tuples)
 
 
-def conll_text_reader(file):
-    result = []
+# Tagger of every process of the pool used by tag_sentences
+_pool_tagger = None
+
+
+def _init_pool_tagger(tagger):
+    global _pool_tagger
+    _pool_tagger = tagger
+
+
+def _tag_chunk(sentences):
+    if isinstance(_pool_tagger, str):
+        # Imported here so the CoreNLP and Stanza taggers do not need NLTK
+        import nltk
+        # The perceptron tagger is loaded once per process and kept by NLTK
+        return nltk.pos_tag_sents(sentences, lang=_pool_tagger)
+    return _pool_tagger.tag_sents(sentences)
+
+
+def tag_sentences(tagger, sentences, processes=None, chunk_size=100):
+    """
+    PoS tag a list of sentences (lists of tokens) in a pool of processes,
+    returning the list of (word, tag) tuples of every sentence, in order.
+
+    tagger is either the language ('eng' or 'rus') of the pretrained NLTK
+    perceptron tagger or a trained tagger with a tag_sents method, such as
+    the TrigramTagger or a CompiledNgramTagger, which is sent once to every
+    process. The sentences are sent to the processes in chunks of
+    chunk_size.
+
+    The processes are always forked, since the scripts calling this have no
+    __main__ guard and would be run again by every process started with
+    spawn or forkserver. Where fork is not available (Windows) the sentences
+    are tagged in this process. The forked processes could hang if keras
+    (TensorFlow) was already imported, so callers import it after tagging.
+    """
+    chunks = (sentences[i:i + chunk_size] for i in range(0, len(sentences), chunk_size))
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        _init_pool_tagger(tagger)
+        return [s for chunk in map(_tag_chunk, chunks) for s in chunk]
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes, initializer=_init_pool_tagger, initargs=(tagger,)) as pool:
+        return [s for chunk in pool.imap(_tag_chunk, chunks) for s in chunk]
+
+
+def _stanza_tag_batch(nlp, batch):
+    for sentence in nlp(batch).sentences:
+        for w in sentence.words:
+            yield (w.text, w.xpos)
+
+
+def stanza_tag(nlp, sentences, batch_tokens=5000):
+    """
+    PoS tag pretokenized sentences (lists of tokens) with a Stanza pipeline
+    built with tokenize_pretokenized=True, yielding one (word, xpos) tuple per
+    token, in order.
+
+    The sentences are read lazily and tagged in batches of about
+    batch_tokens tokens (Stanza sorts the sentences of a call by length
+    itself), so memory depends on batch_tokens and not on the length of the whole text, and the
+    tags of a batch are yielded as soon as it is tagged.
+    """
+    batch = []
+    batch_len = 0
+    for s in sentences:
+        if not s:
+            continue
+        batch.append(s)
+        batch_len += len(s)
+        if batch_len >= batch_tokens:
+            yield from _stanza_tag_batch(nlp, batch)
+            batch = []
+            batch_len = 0
+    if batch:
+        yield from _stanza_tag_batch(nlp, batch)
+
+
+def split_sentences(tokens, max_len=100):
+    """
+    Split a flat list of tokens into sentences, cutting after sentence final
+    punctuation or when a sentence reaches max_len tokens.
+    """
     sentence = []
-    for line in file.readlines():
-        if line == "\n":
-            result.append(sentence)
+    for t in tokens:
+        sentence.append(t)
+        if t in SENTENCE_END or len(sentence) == max_len:
+            yield sentence
             sentence = []
-            continue
-        if line.startswith('#'):
-            continue
-        toks = line.split('\t')
-        if '-' not in toks[0]:
-            sentence.append(toks[1])
-    return result
+    if sentence:
+        yield sentence
+
+
+def corenlp_tag(client, tokens, properties=None, batch_tokens=5000, n_workers=None):
+    """
+    PoS tag a list of tokens with a CoreNLP client, returning one (word, tag)
+    tuple per input token.
+
+    The tokens are grouped into sentences and sent one sentence per line with
+    whitespace tokenization, so a whole batch of sentences goes in a single
+    request, and n_workers batches are annotated concurrently. Whenever
+    CoreNLP does not return exactly one token per input token for a sentence,
+    that sentence is tagged token by token, which is how the 1:1 alignment
+    with the input was kept before.
+    """
+    # Imported here so the other taggers do not need the CoreNLP client
+    from corenlp_utils import annotate_all
+
+    request_props = {'tokenize.whitespace': 'true', 'ssplit.eolonly': 'true'}
+    if properties:
+        request_props.update(properties)
 
+    def tag_token(w):
+        corenlp_model = client.annotate(w, annotators='tokenize,ssplit,pos',
+                                        properties=properties)
+        token = corenlp_model.sentence[0].token[0]
+        return (token.word, token.pos)
+
+    # Sentences with tokens the whitespace tokenizer would split (or drop)
+    # are not sent in the batched requests
+    def is_clean(s):
+        return all(w and len(w.split()) == 1 for w in s)
+
+    batches = [[]]
+    batch_len = 0
+    for s in split_sentences(tokens):
+        if batch_len >= batch_tokens:
+            batches.append([])
+            batch_len = 0
+        batches[-1].append(s)
+        batch_len += len(s)
+
+    texts = ['\n'.join(' '.join(s) for s in batch if is_clean(s)) for batch in batches]
+    # Batches without clean sentences (or no tokens at all) are not sent
+    annotations = annotate_all(client, (t for t in texts if t), n_workers=n_workers,
+                               annotators='tokenize,ssplit,pos',
+                               properties=request_props)
+
+    result = []
+    for batch, text in zip(batches, texts):
+        clean = [is_clean(s) for s in batch]
+        corenlp_sents = list(next(annotations).sentence) if text else []
+        if len(corenlp_sents) != sum(clean):
+            corenlp_sents = [None] * sum(clean)
+        corenlp_sents = iter(corenlp_sents)
+
+        for s, c in zip(batch, clean):
+            corenlp_s = next(corenlp_sents) if c else None
+            if corenlp_s is not None and len(corenlp_s.token) == len(s):
+                result.extend((t.word, t.pos) for t in corenlp_s.token)
+            else:
+                result.extend(tag_token(w) for w in s)
+
+    return result